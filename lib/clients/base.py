@@ -3,10 +3,13 @@ from requests import Session
 
 
 class BaseClient(ABC):
+    DEFAULT_TIMEOUT = 10
+
     def __init__(self, host, notification):
         self.host = host.rstrip("/")
         self.notification = notification
         self.session = Session()
+        self.timeout = self.DEFAULT_TIMEOUT
 
     @abstractmethod
     def search(self, tmdb_id, query, mode, media_type, season, episode):
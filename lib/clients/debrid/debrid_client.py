@@ -3,6 +3,7 @@ import traceback
 import requests
 from lib.api.jacktook.kodi import kodilog
 from abc import ABC, abstractmethod
+from lib.clients.debrid.transport import get_transport
 
 from lib.utils.kodi_utils import notification
 
@@ -29,7 +30,7 @@ class DebridClient(ABC):
 
     def _perform_request(self, method, url, data, params, json):
         try:
-            return requests.Session().request(
+            return get_transport(type(self).__name__).request(
                 method,
                 url,
                 params=params,
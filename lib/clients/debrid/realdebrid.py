@@ -1,5 +1,10 @@
+from datetime import timedelta
+from hashlib import sha256
+from threading import Lock
 from time import time
 from lib.clients.debrid.debrid_client import DebridClient, ProviderException
+from lib.db.cached import cache
+from lib.db.debrid_db import debrid_db
 from lib.utils.kodi_utils import sleep as ksleep
 from base64 import b64encode, b64decode
 from lib.utils.kodi_utils import (
@@ -14,6 +19,29 @@ from lib.utils.utils import supported_video_extensions
 from xbmcgui import DialogProgress
 
 
+ACCESS_TOKEN_IDENTIFIER = "rd_access_token|{}"
+ACTIVE_LIMIT_ERROR = "Too many active downloads"
+# Refresh the access token this many seconds before it expires.
+ACCESS_TOKEN_MARGIN = 300
+
+_access_token_lock = Lock()
+
+
+class ActiveLimitError(ProviderException):
+    """
+    The active downloads limit was reached. Unlike other ProviderExceptions
+    it shows no notification when raised, as add_rd_magnet frees a slot and
+    retries first; whoever gives up on it calls notify.
+    """
+
+    def __init__(self):
+        self.message = ACTIVE_LIMIT_ERROR
+        Exception.__init__(self, self.message)
+
+    def notify(self):
+        notification(self.message)
+
+
 class RealDebrid(DebridClient):
     BASE_URL = "https://api.real-debrid.com/rest/1.0"
     OAUTH_URL = "https://api.real-debrid.com/oauth/v2"
@@ -27,17 +55,48 @@ class RealDebrid(DebridClient):
                     "Authorization": f"Bearer {token_data['private_token']}"
                 }
             else:
-                access_token_data = self.get_token(
-                    token_data["client_id"],
-                    token_data["client_secret"],
-                    token_data["code"],
-                )
                 self.headers = {
-                    "Authorization": f"Bearer {access_token_data['access_token']}"
+                    "Authorization": f"Bearer {self.get_access_token(token_data)}"
                 }
 
+    def get_access_token(self, token_data):
+        """
+        Access token of the OAuth credentials, shared by every client and
+        plugin invocation until it gets close to its expiry.
+        """
+        with _access_token_lock:
+            access_token = cache.get(self._access_token_key())
+            if access_token:
+                return access_token
+
+            access_token_data = self.get_token(
+                token_data["client_id"],
+                token_data["client_secret"],
+                token_data["code"],
+            )
+            expires_in = int(access_token_data.get("expires_in", 0))
+            expires_in -= ACCESS_TOKEN_MARGIN
+            if expires_in > 0:
+                cache.set(
+                    self._access_token_key(),
+                    access_token_data["access_token"],
+                    timedelta(seconds=expires_in),
+                )
+            return access_token_data["access_token"]
+
+    def clear_access_token(self):
+        cache.delete(self._access_token_key())
+
+    def _access_token_key(self):
+        # Cache keys are stored readable, keep the credential out of them.
+        digest = sha256(str(self.token).encode("utf-8")).hexdigest()
+        return ACCESS_TOKEN_IDENTIFIER.format(digest)
+
     def _handle_service_specific_errors(self, error_data: dict, status_code: int):
         error_code = error_data.get("error_code")
+        if status_code == 401 or error_code == 8:
+            # Revoked or expired early, get a new one on the next client.
+            self.clear_access_token()
         if error_code == 9:
             raise ProviderException("Real-Debrid Permission denied")
         elif error_code == 22:
@@ -49,14 +108,10 @@ class RealDebrid(DebridClient):
         elif error_code == 25:
             raise ProviderException("Service Unavailable")
         elif error_code == 21:
-            raise ProviderException("Too many active downloads")
+            raise ActiveLimitError()
         elif error_code == 35:
             raise ProviderException("Infringing file")
 
-    def __del__(self):
-        if self.token:
-            self.disable_access_token()
-
     def _make_request(
         self,
         method,
@@ -135,6 +190,8 @@ class RealDebrid(DebridClient):
             return token_data
 
     def remove_auth(self):
+        self.clear_access_token()
+        debrid_db.clear_rd_torrents()
         set_setting("real_debrid_token", "")
         set_setting("real_debid_authorized", "false")
         set_setting("real_debrid_user", "")
@@ -162,6 +219,8 @@ class RealDebrid(DebridClient):
                     response = self.authorize(device_code)
                     if "token" in response:
                         progressDialog.close()
+                        self.clear_access_token()
+                        debrid_db.clear_rd_torrents()
                         set_setting("real_debrid_token", response["token"])
                         set_setting("real_debid_authorized", "true")
                         self.token = response["token"]
@@ -181,7 +240,11 @@ class RealDebrid(DebridClient):
         interval = 5
         cancelled = False
         DEBRID_ERROR_STATUS = ("magnet_error", "error", "virus", "dead")
-        response = self.add_magent_link(magnet_url)
+        try:
+            response = self.add_magent_link(magnet_url)
+        except ActiveLimitError as e:
+            e.notify()
+            raise
         if response:
             torrent_id = response["id"]
             progressDialog = DialogProgress()
@@ -291,8 +354,20 @@ class RealDebrid(DebridClient):
             "PUT", f"{self.BASE_URL}/torrents/addTorrent", file=file
         )
 
-    def get_user_torrent_list(self):
-        return self._make_request("GET", f"{self.BASE_URL}/torrents")
+    def get_user_torrent_list(self, page=None, limit=None):
+        params = {}
+        if page:
+            params["page"] = page
+        if limit:
+            params["limit"] = limit
+        response = self._perform_request(
+            "GET", f"{self.BASE_URL}/torrents", None, params, None
+        )
+        self._handle_errors(response, False)
+        # Real-Debrid answers 204 without a body past the last page.
+        if response.status_code == 204:
+            return []
+        return self._parse_response(response, False)
 
     def get_user_downloads_list(self, page=1):
         return self._make_request(
@@ -0,0 +1,127 @@
+import random
+from threading import Lock
+from time import monotonic, sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lib.api.jacktook.kodi import kodilog
+
+
+# Requests per second and burst size per provider, under their API limits
+# (Real-Debrid allows 250 requests per minute).
+RATE_LIMITS = {
+    "RealDebrid": (4, 10),
+    "Torbox": (5, 10),
+    "Premiumize": (5, 10),
+    "EasyDebrid": (5, 10),
+    "AllDebrid": (10, 12),
+}
+DEFAULT_RATE_LIMIT = (5, 10)
+
+RETRY_STATUS = (429, 503)
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 10.0
+POOL_SIZE = 10
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+        self.lock = Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available. Returns the wait."""
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            sleep(wait)
+        return wait
+
+
+class Transport:
+    """
+    HTTP transport shared by every client of a provider: one keep-alive
+    session, a token bucket rate governor and retries with jittered backoff
+    on 429 and 503 answers.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats_lock = Lock()
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "throttled": 0,
+            "throttle_wait": 0.0,
+        }
+
+    def _count(self, key, value=1):
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def request(self, method, url, **kwargs):
+        for attempt in range(MAX_RETRIES + 1):
+            wait = self.bucket.acquire()
+            if wait:
+                self._count("throttled")
+                self._count("throttle_wait", wait)
+
+            self._count("requests")
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                return response
+
+            delay = self._retry_delay(response, attempt)
+            self._count("retries")
+            kodilog(
+                f"{self.name} answered {response.status_code}, "
+                f"retrying in {delay:.1f}s"
+            )
+            sleep(delay)
+
+    @staticmethod
+    def _retry_delay(response, attempt):
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+        backoff = min(BACKOFF_BASE * 2**attempt, BACKOFF_MAX)
+        return random.uniform(backoff / 2, backoff)
+
+    def get_stats(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+
+_transports = {}
+_transports_lock = Lock()
+
+
+def get_transport(name):
+    with _transports_lock:
+        transport = _transports.get(name)
+        if transport is None:
+            rate, capacity = RATE_LIMITS.get(name, DEFAULT_RATE_LIMIT)
+            transport = _transports[name] = Transport(name, rate, capacity)
+        return transport
+
+
+def get_transport_stats():
+    with _transports_lock:
+        transports = list(_transports.values())
+    return {transport.name: transport.get_stats() for transport in transports}
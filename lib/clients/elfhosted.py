@@ -14,7 +14,7 @@ class Elfhosted(BaseClient):
                 url = f"{self.host}/stream/series/{imdb_id}:{season}:{episode}.json"
             elif mode == "movies" or media_type == "movies":
                 url = f"{self.host}/stream/{mode}/{imdb_id}.json"
-            res = self.session.get(url, timeout=10)
+            res = self.session.get(url, timeout=self.timeout)
             if res.status_code != 200:
                 return
             response = self.parse_response(res)
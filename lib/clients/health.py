@@ -0,0 +1,133 @@
+from datetime import timedelta
+from threading import Lock
+from time import time
+
+from lib.api.jacktook.kodi import kodilog
+from lib.db.cached import cache
+from lib.utils.kodi_utils import get_setting
+from lib.utils.settings import get_int_setting
+
+
+HEALTH_IDENTIFIER = "indexer_health|{}"
+HEALTH_EXPIRATION = timedelta(days=30)
+
+LATENCY_SAMPLES = 50
+MIN_LATENCY_SAMPLES = 5
+# Consecutive failures before an indexer is skipped for a cool-down period.
+FAILURE_THRESHOLD = 5
+MIN_TIMEOUT = 3
+TIMEOUT_FACTOR = 1.5
+# How long a successful answer vouches for an indexer without probing it.
+HEALTHY_FRESHNESS = 300
+
+_lock = Lock()
+
+
+def is_health_tracking_enabled():
+    return get_setting("indexers_health_tracking")
+
+
+def _default_state():
+    return {
+        "latencies": [],
+        "outcomes": [],
+        "failures": 0,
+        "open_until": 0,
+        "last_success": 0,
+        "last_probe": None,
+    }
+
+
+def _load(indexer):
+    state = cache.get(HEALTH_IDENTIFIER.format(indexer), hashed_key=True)
+    return state or _default_state()
+
+
+def _save(indexer, state):
+    cache.set(
+        HEALTH_IDENTIFIER.format(indexer),
+        state,
+        HEALTH_EXPIRATION,
+        hashed_key=True,
+    )
+
+
+def record_success(indexer, latency):
+    with _lock:
+        state = _load(indexer)
+        state["latencies"] = (state["latencies"] + [round(latency, 3)])[
+            -LATENCY_SAMPLES:
+        ]
+        state["outcomes"] = (state["outcomes"] + [1])[-LATENCY_SAMPLES:]
+        state["failures"] = 0
+        state["open_until"] = 0
+        state["last_success"] = time()
+        _save(indexer, state)
+
+
+def record_failure(indexer, latency=None):
+    with _lock:
+        state = _load(indexer)
+        if latency is not None:
+            state["latencies"] = (state["latencies"] + [round(latency, 3)])[
+                -LATENCY_SAMPLES:
+            ]
+        state["outcomes"] = (state["outcomes"] + [0])[-LATENCY_SAMPLES:]
+        state["failures"] += 1
+        if state["failures"] >= FAILURE_THRESHOLD:
+            cooldown = get_int_setting("indexers_breaker_cooldown") * 60
+            state["open_until"] = time() + cooldown
+            kodilog(
+                f"{indexer} failed {state['failures']} times in a row, "
+                f"skipping it for {cooldown}s"
+            )
+        _save(indexer, state)
+
+
+def record_probe(indexer, ok):
+    """
+    Outcome of a health endpoint probe. Kept apart from the search latencies
+    and the circuit breaker, a ping says little about how searches behave.
+    """
+    with _lock:
+        state = _load(indexer)
+        state["last_probe"] = {"ok": ok, "time": time()}
+        _save(indexer, state)
+
+
+def is_available(indexer):
+    """False while the indexer circuit breaker is open."""
+    return _load(indexer)["open_until"] <= time()
+
+
+def is_recently_healthy(indexer):
+    return time() - _load(indexer)["last_success"] < HEALTHY_FRESHNESS
+
+
+def latency_percentile(latencies, percentile):
+    ordered = sorted(latencies)
+    index = min(int(round(percentile / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def get_adaptive_timeout(indexer, max_timeout):
+    """Timeout derived from the observed p95 latency, capped by the setting."""
+    latencies = _load(indexer)["latencies"]
+    if len(latencies) < MIN_LATENCY_SAMPLES:
+        return max_timeout
+    timeout = latency_percentile(latencies, 95) * TIMEOUT_FACTOR
+    return max(MIN_TIMEOUT, min(int(timeout + 0.5), max_timeout))
+
+
+def get_health_stats(indexer):
+    state = _load(indexer)
+    latencies = state["latencies"]
+    outcomes = state["outcomes"]
+    return {
+        "p50": latency_percentile(latencies, 50) if latencies else None,
+        "p95": latency_percentile(latencies, 95) if latencies else None,
+        "error_rate": outcomes.count(0) / len(outcomes) if outcomes else 0,
+        "failures": state["failures"],
+        "open_until": state["open_until"],
+        "last_probe": state.get("last_probe"),
+    }
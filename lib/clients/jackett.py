@@ -12,6 +12,7 @@ class Jackett(BaseClient):
     def __init__(self, host, apikey, notification):
         super().__init__(host, notification)
         self.apikey = apikey
+        self.timeout = get_jackett_timeout()
         self.base_url = f"{self.host}/api/v2.0/indexers/all/results/torznab/api?apikey={self.apikey}"
 
     def search(self, query, mode, season=None, episode=None):
@@ -40,7 +41,7 @@ class Jackett(BaseClient):
 
             all_results = []
             for url in urls:
-                response = self.session.get(url, timeout=get_jackett_timeout())
+                response = self.session.get(url, timeout=self.timeout)
 
                 if response.status_code != 200:
                     self.notification(f"{translation(30229)} ({response.status_code})")
@@ -16,7 +16,7 @@ class Jackgram(BaseClient):
             else:
                 url = f"{self.host}/search?query={query}"
 
-            res = self.session.get(url, timeout=10)
+            res = self.session.get(url, timeout=self.timeout)
             if res.status_code != 200:
                 return
             if mode in ["tv", "movies"]:
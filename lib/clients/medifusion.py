@@ -18,7 +18,7 @@ class MediaFusion(BaseClient):
 
     def extract_api_key(self):
         if get_setting("real_debrid_enabled"):
-            api_key = get_cached(path="md.rd.key")
+            api_key = get_cached(path="md.rd.key", namespace="settings")
             if api_key:
                 return api_key
             config_json = self.get_config_json()
@@ -32,7 +32,7 @@ class MediaFusion(BaseClient):
             api_key = (
                 path.replace(self.host, "").replace("manifest.json", "").strip("/")
             )
-            set_cached(data=api_key, path="md.rd.key")
+            set_cached(data=api_key, path="md.rd.key", namespace="settings")
             return api_key
         else:
             return MEDIA_FUSION_DEFAULT_KEY
@@ -57,7 +57,7 @@ class MediaFusion(BaseClient):
                 url = f"{self.host}/{self.api_key}/stream/series/{imdb_id}:{season}:{episode}.json"
             elif mode == "movies" or media_type == "movies":
                 url = f"{self.host}/{self.api_key}/stream/movie/{imdb_id}.json"
-            res = self.session.get(url, headers=USER_AGENT_HEADER, timeout=10)
+            res = self.session.get(url, headers=USER_AGENT_HEADER, timeout=self.timeout)
             if res.status_code != 200:
                 return
             return self.parse_response(res.json())
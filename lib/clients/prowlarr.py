@@ -8,6 +8,7 @@ class Prowlarr(BaseClient):
         super().__init__(host, notification)
         self.base_url = f"{self.host}/api/v1/search"
         self.apikey = apikey
+        self.timeout = get_prowlarr_timeout()
 
     def search(
         self,
@@ -41,7 +42,7 @@ class Prowlarr(BaseClient):
             response = self.session.get(
                 self.base_url,
                 params=params,
-                timeout=get_prowlarr_timeout(),
+                timeout=self.timeout,
                 headers=headers,
             )
             if response.status_code != 200:
@@ -1,142 +1,391 @@
+from queue import Empty, Queue
+from threading import Event, Thread
+from time import time
+
 from lib.api.jacktook.kodi import kodilog
+from lib.clients.health import (
+    get_adaptive_timeout,
+    get_health_stats,
+    is_available,
+    is_health_tracking_enabled,
+    record_failure,
+    record_success,
+)
+from lib.providers import PROVIDERS_TIMEOUT
 from lib.utils.client_utils import get_client
 from lib.utils.kodi_utils import get_setting
-from lib.utils.utils import Indexer, get_cached, set_cached
+from lib.utils.settings import (
+    get_int_setting,
+    get_jackett_timeout,
+    get_prowlarr_timeout,
+)
+from lib.utils.utils import (
+    Indexer,
+    get_negative_cached,
+    get_swr_cached,
+    normalize_title,
+    revalidate_later,
+    set_negative_cached,
+    set_swr_cached,
+)
+
+
+INDEXER_DEFAULT_TIMEOUT = 10
+# Extra time given to an indexer on top of its request timeout, some
+# clients (Jackett) can issue more than one request per search.
+INDEXER_DEADLINE_GRACE = 2
+# Longest wait of the search loop before it checks for an early stop.
+STOP_POLL_INTERVAL = 0.25
 
 
 def show_dialog(title, message, dialog):
     dialog.update(0, f"Jackprend [COLOR FFFF6B00]{title}[/COLOR]", message)
 
 
+def get_configured_timeout(indexer_key):
+    if indexer_key == Indexer.JACKETT:
+        return get_jackett_timeout()
+    elif indexer_key == Indexer.PROWLARR:
+        return get_prowlarr_timeout()
+    elif indexer_key == Indexer.ZILEAN:
+        return get_int_setting("zilean_timeout")
+    elif indexer_key == Indexer.BURST:
+        return PROVIDERS_TIMEOUT
+    return INDEXER_DEFAULT_TIMEOUT
+
+
+def get_indexer_timeout(indexer_key):
+    timeout = get_configured_timeout(indexer_key)
+    # Burst waits on its providers for a fixed time, a shorter deadline only
+    # drops the results it gets.
+    if is_health_tracking_enabled() and indexer_key != Indexer.BURST:
+        return get_adaptive_timeout(indexer_key, timeout)
+    return timeout
+
+
 def search_client(
-    query, ids, mode, media_type, dialog, rescrape=False, season=1, episode=1
+    query,
+    ids,
+    mode,
+    media_type,
+    dialog,
+    rescrape=False,
+    season=1,
+    episode=1,
+    on_results=None,
 ):
+    """
+    Search every enabled indexer. When given, on_results(indexer, results) is
+    called as soon as each indexer answers, before the full search is done.
+    If it returns True the remaining indexers are abandoned.
 
-    def perform_search(indexer_key, dialog, *args, **kwargs):
-        if indexer_key != Indexer.BURST:
-            show_dialog(indexer_key, f"Searching {indexer_key}", dialog)
-        client = get_client(indexer_key)
-        if not client:
-            return
-        results = client.search(*args, **kwargs)
-        if results:
-            total_results.extend(results)
+    Results are cached per indexer under the media identity, so only the
+    indexers without fresh results (stale, failed or newly enabled) are
+    queried again. Empty answers are kept as short lived negative entries.
+    A rescrape ignores those and queries stale indexers before returning.
+    """
+    if ids:
+        tmdb_id, _, imdb_id = ids.split(", ")
+    else:
+        tmdb_id = imdb_id = -1
+
+    identity = get_search_identity(query, ids, mode, media_type, season, episode)
+
+    dialog.create("")
+
+    jobs = build_search_jobs(
+        query, mode, media_type, season, episode, tmdb_id, imdb_id
+    )
+
+    negative = None if rescrape else get_negative_cached(identity, namespace="search")
+    if negative and {job[0] for job in jobs} <= set(negative["indexers"]):
+        kodilog(f"Negative search cache hit for {identity}")
+        return []
 
-    if not rescrape:
-        if mode == "tv" or media_type == "tv" or mode == "anime":
-            cached_results = get_cached(query, params=(episode, "index"))
+    cached_results = []
+    pending_jobs = []
+    empty_indexers = set()
+    for job in jobs:
+        results, stale = get_swr_cached(identity, params=job[0], namespace="search")
+        if results and stale and rescrape:
+            pending_jobs.append(job)
+        elif results:
+            cached_results.extend(results)
+            if stale:
+                revalidate_later(
+                    f"{identity}|{job[0]}", refresh_indexer_results, identity, job
+                )
+        elif not rescrape and get_negative_cached(
+            identity, params=job[0], namespace="search"
+        ):
+            empty_indexers.add(job[0])
         else:
-            cached_results = get_cached(query, params=("index"))
+            pending_jobs.append(job)
 
-        if cached_results:
-            dialog.create("")
+    if cached_results:
+        kodilog(f"Search cache hit for {identity}: {len(cached_results)} results")
+        if on_results and on_results(None, cached_results):
             return cached_results
 
+    if is_health_tracking_enabled():
+        pending_jobs = [job for job in pending_jobs if _check_available(job[0])]
+
+    def store_results(indexer_key, results):
+        if results:
+            set_swr_cached(results, identity, params=indexer_key, namespace="search")
+            if on_results:
+                return on_results(indexer_key, results)
+        elif results is not None:
+            empty_indexers.add(indexer_key)
+            set_negative_cached(True, identity, params=indexer_key, namespace="search")
+
+    if get_setting("indexers_concurrent_search"):
+        total_results = fan_out_search(pending_jobs, dialog, store_results)
+    else:
+        total_results = sequential_search(pending_jobs, dialog, store_results)
+
+    if not cached_results and not total_results and empty_indexers:
+        # Indexers that failed are left out, so they are asked again next time.
+        set_negative_cached(
+            {"indexers": sorted(empty_indexers)}, identity, namespace="search"
+        )
+
+    return cached_results + total_results
+
+
+def refresh_indexer_results(identity, job):
+    indexer_key, args = job
+    results = perform_search(indexer_key, *args)
+    if results:
+        set_swr_cached(results, identity, params=indexer_key, namespace="search")
+
+
+def get_search_identity(query, ids, mode, media_type, season, episode):
+    """
+    Cache identity of a search, e.g. "tv:tmdb:1399:3:5" or "movies:imdb:tt0133093".
+    Searches without ids (direct searches) are indexed by their normalized
+    title instead, so spelling variants share the same entry.
+    """
+    kind = media_type if mode == "multi" and media_type else mode
+
+    tmdb_id = imdb_id = ""
     if ids:
         tmdb_id, _, imdb_id = ids.split(", ")
+
+    if tmdb_id and tmdb_id != "None":
+        identity = f"{kind}:tmdb:{tmdb_id}"
+    elif imdb_id and imdb_id != "None":
+        identity = f"{kind}:imdb:{imdb_id}"
     else:
-        tmdb_id = imdb_id = -1
+        identity = f"{kind}:title:{normalize_title(query)}"
+
+    if mode == "tv" or media_type == "tv" or mode == "anime":
+        identity += f":{season}:{episode}"
+    return identity
 
-    dialog.create("")
-    total_results = []
+
+def build_search_jobs(query, mode, media_type, season, episode, tmdb_id, imdb_id):
+    """Return the (indexer, search args) pairs for every enabled indexer."""
+    jobs = []
 
     if get_setting("torrentio_enabled"):
         if imdb_id != -1:
-            perform_search(
-                Indexer.TORRENTIO,
-                dialog,
-                imdb_id,
-                mode,
-                media_type,
-                season,
-                episode,
+            jobs.append(
+                (Indexer.TORRENTIO, (imdb_id, mode, media_type, season, episode))
             )
 
     if get_setting("mediafusion_enabled"):
         if imdb_id != -1:
-            perform_search(
-                Indexer.MEDIAFUSION,
-                dialog,
-                imdb_id,
-                mode,
-                media_type,
-                season,
-                episode,
+            jobs.append(
+                (Indexer.MEDIAFUSION, (imdb_id, mode, media_type, season, episode))
             )
 
     if get_setting("elfhosted_enabled"):
         if imdb_id != -1:
-            perform_search(
-                Indexer.ELHOSTED,
-                dialog,
-                imdb_id,
-                mode,
-                media_type,
-                season,
-                episode,
+            jobs.append(
+                (Indexer.ELHOSTED, (imdb_id, mode, media_type, season, episode))
             )
 
     if get_setting("zilean_enabled"):
         if imdb_id != -1:
-            perform_search(
-                Indexer.ZILEAN,
-                dialog,
-                query,
-                mode,
-                media_type,
-                season,
-                episode,
-            )
+            jobs.append((Indexer.ZILEAN, (query, mode, media_type, season, episode)))
 
     if get_setting("jacktookburst_enabled"):
-        perform_search(
-            Indexer.BURST,
-            dialog,
-            tmdb_id,
-            query,
-            mode,
-            media_type,
-            season,
-            episode,
+        jobs.append(
+            (Indexer.BURST, (tmdb_id, query, mode, media_type, season, episode))
         )
 
     if get_setting("prowlarr_enabled"):
         indexers_ids = get_setting("prowlarr_indexer_ids")
-        perform_search(
-            Indexer.PROWLARR,
-            dialog,
-            query,
-            mode,
-            season,
-            episode,
-            indexers_ids,
+        jobs.append(
+            (Indexer.PROWLARR, (query, mode, season, episode, indexers_ids))
         )
 
     if get_setting("jackett_enabled"):
-        perform_search(
-            Indexer.JACKETT,
-            dialog,
-            query,
-            mode,
-            season,
-            episode,
-        )
+        jobs.append((Indexer.JACKETT, (query, mode, season, episode)))
 
     if get_setting("jackgram_enabled"):
-        perform_search(
-            Indexer.JACKGRAM,
-            dialog,
-            tmdb_id,
-            query,
-            mode,
-            media_type,
-            season,
-            episode,
+        jobs.append(
+            (Indexer.JACKGRAM, (tmdb_id, query, mode, media_type, season, episode))
         )
 
-    if mode == "tv" or media_type == "tv" or mode == "anime":
-        set_cached(total_results, query, params=(episode, "index"))
-    else:
-        set_cached(total_results, query, params=("index"))
+    return jobs
+
+
+def _check_available(indexer_key):
+    if is_available(indexer_key):
+        return True
+    kodilog(f"Skipping {indexer_key}, circuit open: {get_health_stats(indexer_key)}")
+    return False
+
+
+def perform_search(indexer_key, *args):
+    client = get_client(indexer_key)
+    if not client:
+        return
+
+    tracking = is_health_tracking_enabled()
+    if tracking:
+        client.timeout = get_indexer_timeout(indexer_key)
+
+    start = time()
+    try:
+        results = client.search(*args)
+    except Exception as e:
+        kodilog(f"{indexer_key} search failed: {e}")
+        results = None
+
+    if tracking:
+        # Clients swallow their own errors and return None on failure.
+        if results is None:
+            record_failure(indexer_key, time() - start)
+        else:
+            record_success(indexer_key, time() - start)
+    return results
 
+
+def sequential_search(jobs, dialog, on_answer=None):
+    """
+    Query indexers one after another. on_answer(indexer, results) is called
+    for every answer, results being None on failure; returning True stops.
+    """
+    total_results = []
+    for indexer_key, args in jobs:
+        if indexer_key != Indexer.BURST:
+            show_dialog(indexer_key, f"Searching {indexer_key}", dialog)
+        results = perform_search(indexer_key, *args)
+        if results:
+            total_results.extend(results)
+        if on_answer and on_answer(indexer_key, results):
+            break
     return total_results
+
+
+def fan_out_search(jobs, dialog, on_answer=None):
+    """
+    Query every indexer at once. Each indexer gets its own deadline, capped by
+    the global search budget; results arriving after it are dropped.
+    on_answer behaves as in sequential_search, but runs on its own thread so
+    slow processing of one answer does not make the others miss their
+    deadlines.
+    """
+    total_results = []
+    if not jobs:
+        return total_results
+
+    queue = Queue()
+    start = time()
+    budget_deadline = start + get_int_setting("indexers_search_budget")
+
+    deadlines = {}
+    for indexer_key, args in jobs:
+        deadline = min(
+            start + get_indexer_timeout(indexer_key) + INDEXER_DEADLINE_GRACE,
+            budget_deadline,
+        )
+        deadlines[indexer_key] = deadline
+        Thread(
+            target=_search_worker,
+            args=(indexer_key, args, deadline, queue),
+            daemon=True,
+        ).start()
+
+    answers = Queue()
+    stopped = Event()
+    processor = None
+    if on_answer:
+        processor = Thread(
+            target=_answer_worker,
+            args=(answers, on_answer, stopped),
+            daemon=True,
+        )
+        processor.start()
+
+    total = len(jobs)
+    show_dialog("Indexers", f"Searching {total} indexers", dialog)
+
+    while deadlines and not stopped.is_set():
+        try:
+            # Answers already queued are taken before any deadline expires.
+            indexer_key, results, late = queue.get_nowait()
+        except Empty:
+            now = time()
+            for indexer_key in [k for k, d in deadlines.items() if d <= now]:
+                kodilog(f"{indexer_key} missed its search deadline")
+                del deadlines[indexer_key]
+            if not deadlines:
+                break
+            timeout = min(min(deadlines.values()) - now, STOP_POLL_INTERVAL)
+            try:
+                indexer_key, results, late = queue.get(timeout=timeout)
+            except Empty:
+                continue
+
+        deadlines.pop(indexer_key, None)
+        if late:
+            continue
+
+        if results:
+            total_results.extend(results)
+        if processor:
+            answers.put((indexer_key, results))
+
+        done = total - len(deadlines)
+        dialog.update(
+            int(done / total * 100),
+            f"Jackprend [COLOR FFFF6B00]{indexer_key}[/COLOR]",
+            f"Indexers: {done}/{total}",
+        )
+
+    if processor:
+        answers.put(None)
+        processor.join()
+    if stopped.is_set():
+        kodilog(f"Search stopped early, {len(deadlines)} indexers abandoned")
+    return total_results
+
+
+def _search_worker(indexer_key, args, deadline, queue):
+    start = time()
+    results = perform_search(indexer_key, *args)
+    late = time() > deadline
+    if late:
+        kodilog(
+            f"{indexer_key} answered after {time() - start:.1f}s, "
+            f"dropping {len(results or [])} late results"
+        )
+    queue.put((indexer_key, results, late))
+
+
+def _answer_worker(answers, on_answer, stopped):
+    while True:
+        answer = answers.get()
+        if answer is None:
+            return
+        if stopped.is_set():
+            continue
+        try:
+            if on_answer(*answer):
+                stopped.set()
+        except Exception as e:
+            kodilog(f"Failed to process {answer[0]} results: {e}")
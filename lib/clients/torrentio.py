@@ -16,7 +16,7 @@ class Torrentio(BaseClient):
                 url = f"{self.host}/stream/series/{imdb_id}:{season}:{episode}.json"
             elif mode == "movies" or media_type == "movies":
                 url = f"{self.host}/stream/{mode}/{imdb_id}.json"
-            res = self.session.get(url, headers=USER_AGENT_HEADER, timeout=10)
+            res = self.session.get(url, headers=USER_AGENT_HEADER, timeout=self.timeout)
             if res.status_code != 200:
                 return
             return self.parse_response(res)
@@ -4,7 +4,12 @@ from types import SimpleNamespace
 from requests import ConnectTimeout, ReadTimeout
 from requests.exceptions import RequestException
 from lib.clients.base import BaseClient
-from lib.utils.utils import USER_AGENT_HEADER
+from lib.clients.health import (
+    is_health_tracking_enabled,
+    is_recently_healthy,
+    record_probe,
+)
+from lib.utils.utils import USER_AGENT_HEADER, Indexer
 
 
 class Zilean(BaseClient):
@@ -16,12 +21,21 @@ class Zilean(BaseClient):
             return
 
     def validate(self) -> bool:
+        # A recent answer recorded in the health registry already proves the
+        # host is up, only probe the health endpoint when there is none.
+        tracking = is_health_tracking_enabled()
+        if tracking and is_recently_healthy(Indexer.ZILEAN):
+            return True
         try:
             response = self.ping()
-            return response.ok
         except Exception as e:
-            self._notification(f"Zilean failed to initialize: {e}")
+            if tracking:
+                record_probe(Indexer.ZILEAN, False)
+            self.notification(f"Zilean failed to initialize: {e}")
             return False
+        if tracking:
+            record_probe(Indexer.ZILEAN, response.ok)
+        return response.ok
 
     def search(self, query, mode, media_type, season, episode):
         try:
@@ -48,7 +62,10 @@ class Zilean(BaseClient):
                 params.update({"Season": season, "Episode": episode})
 
             res = self.session.get(
-                filtered_url, params=params, headers=USER_AGENT_HEADER, timeout=10
+                filtered_url,
+                params=params,
+                headers=USER_AGENT_HEADER,
+                timeout=self.timeout,
             )
         else:
             payload = {"queryText": query}
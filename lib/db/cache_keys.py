@@ -0,0 +1,118 @@
+import pickle
+from functools import lru_cache
+from hashlib import blake2b, sha256
+
+
+# Keys derived by derive_key start with one of these, pickle_hash keys of
+# older versions are a bare 64 characters hex digest.
+KEY_PREFIX = "k:"
+HASH_PREFIX = "h:"
+# Longer canonical forms are stored digested.
+MAX_PLAIN_KEY = 200
+KEY_MEMO_SIZE = 4096
+
+LEGACY_KEY_GLOB = "[0-9a-f]" * 64 + "*"
+
+
+def pickle_hash(obj):
+    data = pickle.dumps(obj)
+    h = sha256()
+    h.update(data)
+    return h.hexdigest()
+
+
+_PRIMITIVES = frozenset((str, int, float, bool, type(None)))
+
+
+def canonical(obj):
+    """
+    Canonical string of obj, built from str, int, float, bool, None and
+    tuples, lists and dicts of them. Raises TypeError for anything else.
+    """
+    kind = type(obj)
+    if kind in _PRIMITIVES:
+        return repr(obj)
+    if kind is tuple or kind is list:
+        if _PRIMITIVES.issuperset(map(type, obj)):
+            return repr(obj)
+        items = ",".join([canonical(item) for item in obj])
+        return "(" + items + ")" if kind is tuple else "[" + items + "]"
+    if kind is dict:
+        items = sorted(canonical(k) + ":" + canonical(v) for k, v in obj.items())
+        return "{" + ",".join(items) + "}"
+    raise TypeError("No canonical form for {}".format(kind.__name__))
+
+
+def _finish(key):
+    if len(key) > MAX_PLAIN_KEY:
+        key = blake2b(key.encode("utf-8"), digest_size=20).hexdigest()
+    return KEY_PREFIX + key
+
+
+def _derive(obj):
+    try:
+        key = canonical(obj)
+    except TypeError:
+        return HASH_PREFIX + pickle_hash(obj)
+    return _finish(key)
+
+
+# typed, as 1, 1.0 and True are equal but have different keys. Only flat
+# arguments are memoized, the types of nested items are not told apart.
+@lru_cache(maxsize=KEY_MEMO_SIZE, typed=True)
+def _derive_str(obj):
+    return _derive(obj)
+
+
+@lru_cache(maxsize=KEY_MEMO_SIZE, typed=True)
+def _derive_tuple(*items):
+    return _derive(items)
+
+
+def _is_flat(values):
+    return _PRIMITIVES.issuperset(map(type, values))
+
+
+def derive_key(obj):
+    """
+    Cache key of obj. Primitive keys get a readable canonical key, other
+    objects fall back to pickle_hash. Keys of strings and of flat tuples of
+    primitives are memoized.
+    """
+    kind = type(obj)
+    if kind is str:
+        return _derive_str(obj)
+    if kind is tuple and _is_flat(obj):
+        return _derive_tuple(*obj)
+    return _derive(obj)
+
+
+def _call_key(args, kwargs):
+    try:
+        key = canonical(args)
+        if kwargs:
+            key += "," + canonical(tuple(sorted(kwargs.items())))
+    except TypeError:
+        return HASH_PREFIX + pickle_hash((args, kwargs))
+    return _finish("(" + key + ")")
+
+
+@lru_cache(maxsize=KEY_MEMO_SIZE, typed=True)
+def _call_key_memo(*args, **kwargs):
+    return _call_key(args, kwargs)
+
+
+def call_key(args, kwargs):
+    """
+    Cache key of a function call, the key derive_key gives for
+    (args, tuple(sorted(kwargs.items()))). Calls with hashable arguments are
+    memoized on the arguments themselves, like functools.lru_cache with
+    typed=True the types of items nested in them are not told apart.
+    """
+    try:
+        return _call_key_memo(*args, **kwargs)
+    except TypeError:
+        return _call_key(args, kwargs)
+
+
+legacy_key = pickle_hash
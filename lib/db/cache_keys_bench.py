@@ -0,0 +1,46 @@
+"""
+Cache key derivation benchmark, run from the addon root with:
+
+    python -m lib.db.cache_keys_bench [count]
+"""
+
+import sys
+from timeit import timeit
+
+from lib.db.cache_keys import _call_key, _derive, call_key, derive_key, pickle_hash
+
+
+def make_keys(count):
+    keys = []
+    for i in range(count):
+        show = 1000 + i % 50
+        keys.append("rd_access_token|{}".format(i % 5))
+        keys.append(("tmdb_get", "tv_details", show))
+    return keys
+
+
+def make_calls(count):
+    return [((1000 + i % 50, "tv", i % 10), {"page": i % 3}) for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    keys = make_keys(count)
+    calls = make_calls(count)
+    runs = 5
+    cases = (
+        (keys, "pickle_hash", lambda: [pickle_hash(key) for key in keys]),
+        (keys, "derive_key", lambda: [derive_key(key) for key in keys]),
+        (keys, "no memo", lambda: [_derive(key) for key in keys]),
+        (calls, "call pickle", lambda: [pickle_hash(call) for call in calls]),
+        (calls, "call_key", lambda: [call_key(*call) for call in calls]),
+        (calls, "call no memo", lambda: [_call_key(*call) for call in calls]),
+    )
+    print(f"{len(keys)} keys, {len(calls)} calls, {runs} runs")
+    for items, name, func in cases:
+        elapsed = timeit(func, number=runs) / runs
+        print(f"{name:<12} {elapsed * 1000:8.2f} ms  {len(items) / elapsed:12.0f} keys/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,21 @@ import os
 import pickle
 import sqlite3
 import sys
+import time
 from base64 import b64encode, b64decode
+from collections import OrderedDict, namedtuple
 from datetime import datetime, timedelta
 from functools import wraps
-from hashlib import sha256
+from threading import Lock, RLock
 
 from lib.api.jacktook.kodi import kodilog
+from lib.db import codec
+from lib.db.cache_keys import (
+    LEGACY_KEY_GLOB,
+    call_key,
+    derive_key,
+    legacy_key,
+)
 import xbmcaddon
 import xbmcgui
 
@@ -28,20 +37,54 @@ if not PY3:
 if not os.path.exists(ADDON_DATA):
     os.makedirs(ADDON_DATA)
 
+# auto_vacuum goes first, switching to WAL already writes the database header.
 SQLITE_SETTINGS = {
-    "journal_mode": "wal",
     "auto_vacuum": "full",
+    "journal_mode": "wal",
     "cache_size": 8 * 1024,
     "mmap_size": 64 * 1024 * 1024,
     "synchronous": "normal",
 }
 
 
-def pickle_hash(obj):
-    data = pickle.dumps(obj)
-    h = sha256()
-    h.update(data)
-    return h.hexdigest()
+# Bounds of the in-process tier in front of the SQLite cache.
+MEMORY_TIER_ENTRIES = 512
+MEMORY_TIER_BYTES = 16 * 1024 * 1024
+
+# cached_stats row adding up the hits and misses of the memory tier.
+MEMORY_STATS = "memory_tier"
+
+# user_version of cached.sqlite once no pickle_hash key is left.
+KEY_VERSION = 1
+
+# Deletes leave free pages for the maintenance job to release, instead of
+# rewriting them while the user waits.
+CACHE_SQLITE_SETTINGS = dict(SQLITE_SETTINGS, auto_vacuum="incremental")
+# Reads are written back as last access times in batches of this size.
+ACCESS_FLUSH_SIZE = 64
+# Eviction goes this far under the size budget, so it does not run again on
+# the next few writes.
+EVICTION_TARGET = 0.9
+EVICTION_BATCH = 200
+VACUUM_PAGES = 2000
+
+# ttl, when set, caps the expiry given by callers, so a shorter cache
+# expiration set by the user still applies. share is the part of
+# the size budget the namespace keeps before its own entries get evicted,
+# None for entries never evicted for their share.
+Namespace = namedtuple("Namespace", ["name", "ttl", "share"])
+DEFAULT_NAMESPACE = "default"
+NAMESPACES = {
+    namespace.name: namespace
+    for namespace in (
+        Namespace("search", None, 0.4),
+        Namespace("debrid", None, 0.15),
+        Namespace("metadata", None, 0.3),
+        Namespace("fanart", timedelta(days=7), 0.1),
+        Namespace("settings", timedelta(days=365), None),
+        Namespace(DEFAULT_NAMESPACE, None, 0.05),
+    )
+}
 
 
 class _BaseCache(object):
@@ -49,7 +92,8 @@ class _BaseCache(object):
 
     _load_func = staticmethod(pickle.loads)
     _dump_func = staticmethod(pickle.dumps)
-    _hash_func = staticmethod(pickle_hash)
+    _hash_func = staticmethod(derive_key)
+    _legacy_keys = False
 
     @classmethod
     def get_instance(cls):
@@ -57,23 +101,54 @@ class _BaseCache(object):
             cls.__instance = cls()
         return cls.__instance
 
-    def get(self, key, default=None, hashed_key=False, identifier=""):
-        result = self._get(self._generate_key(key, hashed_key, identifier))
+    def get(
+        self,
+        key,
+        default=None,
+        hashed_key=False,
+        identifier="",
+        namespace=DEFAULT_NAMESPACE,
+        legacy=None,
+    ):
+        # legacy is the object older versions hashed into the key, when it
+        # is not key itself.
+        new_key = self._generate_key(key, hashed_key, identifier)
+        result = self._get(new_key)
+        if not result and self._legacy_keys:
+            if legacy is not None:
+                result = self._migrate(legacy, new_key, identifier)
+            elif not hashed_key:
+                result = self._migrate(key, new_key, identifier)
         ret = default
+        hit = False
         if result:
             data, expires = result
             if expires > datetime.utcnow():
                 ret = self._process(data)
+                hit = True
+        self._count(namespace, hit)
         return ret
 
-    def set(self, key, data, expiry_time, hashed_key=False, identifier=""):
+    def set(
+        self,
+        key,
+        data,
+        expiry_time,
+        hashed_key=False,
+        identifier="",
+        namespace=DEFAULT_NAMESPACE,
+    ):
         if expiry_time == timedelta(0):
             return  # Do nothing, as it will expire immediately
-        
+
+        ttl = NAMESPACES[namespace].ttl
+        if ttl:
+            expiry_time = min(ttl, expiry_time)
         self._set(
             self._generate_key(key, hashed_key, identifier),
             self._prepare(data),
             datetime.utcnow() + expiry_time,
+            namespace,
         )
 
     def close(self):
@@ -86,18 +161,33 @@ class _BaseCache(object):
             key += identifier
         return key
 
+    def _migrate(self, key, new_key, identifier=""):
+        """Move an entry stored under its pickle_hash key to its new key."""
+        old_key = legacy_key(key) + identifier
+        result = self._get(old_key)
+        if result:
+            self._set(new_key, *result)
+            self._delete(old_key)
+        return result
+
     def _process(self, obj):
         return obj
 
     def _prepare(self, s):
         return s
 
+    def _delete(self, key):
+        pass
+
     def _get(self, key):
         raise NotImplementedError("_get needs to be implemented")
 
-    def _set(self, key, data, expires):
+    def _set(self, key, data, expires, namespace=DEFAULT_NAMESPACE):
         raise NotImplementedError("_set needs to be implemented")
 
+    def _count(self, namespace, hit):
+        pass
+
 
 class MemoryCache(_BaseCache):
     def __init__(self, database=ADDON_ID):
@@ -108,56 +198,295 @@ class MemoryCache(_BaseCache):
         data = self._window.getProperty(self._database + key)
         return self._load_func(b64decode(data)) if data else None
 
-    def _set(self, key, data, expires):
+    def _set(self, key, data, expires, namespace=DEFAULT_NAMESPACE):
         self._window.setProperty(
             self._database + key, b64encode(self._dump_func((data, expires))).decode()
         )
 
 
+class LRUTier(object):
+    """
+    Bounded least-recently-used map of key to (value, expires), limited both
+    in entries and in the size of their encoded blobs. Entries remember their
+    namespace, so one can be dropped without the others. Values are kept
+    decoded, a hit returns the stored object itself, so readers that change
+    what they get must copy it first.
+    """
+
+    def __init__(self, max_entries=MEMORY_TIER_ENTRIES, max_bytes=MEMORY_TIER_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= datetime.utcnow():
+                self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[:2]
+
+    def set(self, key, value, expires, size, namespace=DEFAULT_NAMESPACE):
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, expires, size, namespace)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def delete_prefix(self, namespace, prefix=""):
+        with self._lock:
+            keys = [
+                key
+                for key, entry in self._entries.items()
+                if entry[3] == namespace and key.startswith(prefix)
+            ]
+            for key in keys:
+                self._pop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
 class Cache(_BaseCache):
+    _encode = staticmethod(codec.encode)
+    _decode = staticmethod(codec.decode)
+
     def __init__(
         self,
         database=os.path.join(ADDON_DATA, ADDON_ID + ".cached.sqlite"),
-        cleanup_interval=timedelta(minutes=15),
     ):
+        self._memory = LRUTier()
+        self._counters = {}
+        # Memory tier hits and misses already added to cached_stats.
+        self._memory_flushed = (0, 0)
+        self._accessed = {}
+        self._accessed_lock = Lock()
+        # Every statement on the shared connection goes through this lock,
+        # the cache is read and written from worker threads.
+        self._lock = RLock()
         self._conn = sqlite3.connect(
             database,
             detect_types=sqlite3.PARSE_DECLTYPES,
             isolation_level=None,
             check_same_thread=False,
         )
-        self._conn.execute(
+        # auto_vacuum only applies to a new database when set before its
+        # first table, older ones are converted by the maintenance job.
+        for k, v in CACHE_SQLITE_SETTINGS.items():
+            self._execute("PRAGMA {}={}".format(k, v))
+        self._execute(
             "CREATE TABLE IF NOT EXISTS `cached` ("
             "key TEXT PRIMARY KEY NOT NULL, "
             "data BLOB NOT NULL, "
-            "expires TIMESTAMP NOT NULL"
+            "expires TIMESTAMP NOT NULL, "
+            "last_access REAL NOT NULL DEFAULT 0, "
+            "namespace TEXT NOT NULL DEFAULT '{}'"
+            ")".format(DEFAULT_NAMESPACE)
+        )
+        columns = [row[1] for row in self._fetchall("PRAGMA table_info(`cached`)")]
+        if "last_access" not in columns:
+            self._execute(
+                "ALTER TABLE `cached` ADD COLUMN last_access REAL NOT NULL DEFAULT 0"
+            )
+        if "namespace" not in columns:
+            self._execute(
+                "ALTER TABLE `cached` ADD COLUMN namespace TEXT NOT NULL "
+                "DEFAULT '{}'".format(DEFAULT_NAMESPACE)
+            )
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS `cached_stats` ("
+            "namespace TEXT PRIMARY KEY NOT NULL, "
+            "hits INTEGER NOT NULL DEFAULT 0, "
+            "misses INTEGER NOT NULL DEFAULT 0"
             ")"
         )
-        for k, v in SQLITE_SETTINGS.items():
-            self._conn.execute("PRAGMA {}={}".format(k, v))
-        self._cleanup_interval = cleanup_interval
-        self._last_cleanup = datetime.utcnow()
-        self.clean_up()
+        self._legacy_keys = self.version < KEY_VERSION
 
-    def _process(self, obj):
-        return self._load_func(obj)
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._conn.execute(query, params).rowcount
 
-    def _prepare(self, s):
-        return self._dump_func(s)
+    def _fetchone(self, query, params=()):
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()
 
+    def _fetchall(self, query, params=()):
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    # Values are encoded by _set and decoded by _get, so memory tier hits
+    # skip the codec altogether.
     def _get(self, key):
-        self.check_clean_up()
-        return self._conn.execute(
-            "SELECT data, expires FROM `cached` WHERE key = ?", (key,)
-        ).fetchone()
-
-    def _set(self, key, data, expires):
-        self.check_clean_up()
-        self._conn.execute(
-            "INSERT OR REPLACE INTO `cached` (key, data, expires) VALUES(?, ?, ?)",
-            (key, sqlite3.Binary(data), expires),
+        result = self._memory.get(key)
+        if not result:
+            row = self._fetchone(
+                "SELECT data, expires, namespace FROM `cached` WHERE key = ?",
+                (key,),
+            )
+            if not row:
+                return None
+            blob, expires, namespace = row
+            if expires <= datetime.utcnow():
+                return None, expires
+            result = (self._decode(blob), expires)
+            self._memory.set(key, result[0], expires, len(blob), namespace)
+        self._touch(key)
+        return result
+
+    def _set(self, key, data, expires, namespace=DEFAULT_NAMESPACE):
+        blob = self._encode(data)
+        self._execute(
+            "INSERT OR REPLACE INTO `cached` "
+            "(key, data, expires, last_access, namespace) VALUES(?, ?, ?, ?, ?)",
+            (key, sqlite3.Binary(blob), expires, time.time(), namespace),
+        )
+        self._memory.set(key, data, expires, len(blob), namespace)
+
+    def _count(self, namespace, hit):
+        with self._accessed_lock:
+            hits, misses = self._counters.get(namespace, (0, 0))
+            self._counters[namespace] = (hits + hit, misses + (not hit))
+
+    def _touch(self, key):
+        with self._accessed_lock:
+            self._accessed[key] = time.time()
+            flush = len(self._accessed) >= ACCESS_FLUSH_SIZE
+        if flush:
+            try:
+                self.flush_access()
+            except sqlite3.Error as e:
+                # Only bookkeeping, the read itself succeeded.
+                kodilog(f"Cache access flush failed: {e}")
+
+    def flush_access(self):
+        """
+        Write the access times of the entries read since the last flush and
+        add up the hits and misses of each namespace and of the memory tier.
+        """
+        memory = self._memory.stats()
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+            counters, self._counters = self._counters, {}
+            hits, misses = self._memory_flushed
+            if memory["hits"] > hits or memory["misses"] > misses:
+                counters[MEMORY_STATS] = (
+                    memory["hits"] - hits,
+                    memory["misses"] - misses,
+                )
+                self._memory_flushed = (memory["hits"], memory["misses"])
+        if not accessed and not counters:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "UPDATE `cached` SET last_access = ? WHERE key = ?",
+                    [(last_access, key) for key, last_access in accessed.items()],
+                )
+                self._conn.executemany(
+                    "INSERT INTO `cached_stats` (namespace, hits, misses) "
+                    "VALUES (?, ?, ?) ON CONFLICT(namespace) DO UPDATE SET "
+                    "hits = hits + excluded.hits, misses = misses + excluded.misses",
+                    [(namespace, *counts) for namespace, counts in counters.items()],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete(self, key):
+        self._memory.delete(key)
+        self._execute("DELETE FROM `cached` WHERE key = ?", (key,))
+
+    def delete(self, key, hashed_key=False, identifier=""):
+        self._delete(self._generate_key(key, hashed_key, identifier))
+        if not hashed_key and self._legacy_keys:
+            self._delete(legacy_key(key) + identifier)
+
+    def memory_stats(self):
+        """
+        Entries and bytes the in-process tier holds now, with its hits and
+        misses added up over every plugin call.
+        """
+        self.flush_access()
+        stats = self._memory.stats()
+        row = self._fetchone(
+            "SELECT hits, misses FROM `cached_stats` WHERE namespace = ?",
+            (MEMORY_STATS,),
         )
-    
+        stats["hits"], stats["misses"] = row or (0, 0)
+        return stats
+
+    def namespace_stats(self):
+        """Entries, bytes, hits and misses of each namespace."""
+        self.flush_access()
+        stats = {
+            name: {"entries": 0, "bytes": 0, "hits": 0, "misses": 0}
+            for name in NAMESPACES
+        }
+        rows = self._fetchall(
+            "SELECT namespace, COUNT(*), COALESCE(SUM(LENGTH(data)), 0) "
+            "FROM `cached` GROUP BY namespace"
+        )
+        for namespace, entries, size in rows:
+            stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            stats[namespace].update(entries=entries, bytes=size)
+        rows = self._fetchall(
+            "SELECT namespace, hits, misses FROM `cached_stats` WHERE namespace != ?",
+            (MEMORY_STATS,),
+        )
+        for namespace, hits, misses in rows:
+            stats.setdefault(namespace, {"entries": 0, "bytes": 0})
+            stats[namespace].update(hits=hits, misses=misses)
+        return stats
+
+    def invalidate(self, namespace, prefix=""):
+        """
+        Delete the entries of namespace whose key starts with prefix, e.g.
+        invalidate("search", "tv:tmdb:1399:3:") for the searches of a
+        season. Returns the number of entries deleted.
+        """
+        deleted = self._execute(
+            "DELETE FROM `cached` WHERE namespace = ? "
+            "AND SUBSTR(key, 1, LENGTH(?)) = ?",
+            (namespace, prefix, prefix),
+        )
+        self._memory.delete_prefix(namespace, prefix)
+        return deleted
+
     def add_to_list(self, key, item, expires):
         """Append an item to a list stored under the given key."""
         existing_data = self.get_list(key)  # Retrieve the existing list
@@ -174,7 +503,7 @@ class Cache(_BaseCache):
         if result:
             data, expires = result
             if expires > datetime.utcnow():
-                return self._process(data)  # Deserialize the list
+                return self._process(data)
         return []  
 
     def clear_list(self, key):
@@ -186,33 +515,118 @@ class Cache(_BaseCache):
         )
 
     def _set_version(self, version):
-        self._conn.execute("PRAGMA user_version={}".format(version))
+        self._execute("PRAGMA user_version={}".format(version))
 
     @property
     def version(self):
-        return self._conn.execute("PRAGMA user_version").fetchone()[0]
-
-    @property
-    def needs_cleanup(self):
-        return self._last_cleanup + self._cleanup_interval < datetime.utcnow()
+        return self._fetchone("PRAGMA user_version")[0]
 
     def clean_up(self):
-        self._conn.execute(
+        self._execute(
             "DELETE FROM `cached` WHERE expires <= STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW')"
         )
-        self._last_cleanup = datetime.utcnow()
+        if self._legacy_keys:
+            self._check_legacy_keys()
 
-    def clean_all(self):
-        self._conn.execute("DELETE FROM cached")
+    def get_size(self, namespace=None):
+        query = "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM `cached`"
+        if namespace:
+            return self._fetchone(query + " WHERE namespace = ?", (namespace,))[0]
+        return self._fetchone(query)[0]
 
-    def check_clean_up(self):
-        clean_up = self.needs_cleanup
-        if clean_up:
-            self.clean_up()
-        return clean_up
+    @property
+    def size(self):
+        return self.get_size()
+
+    def evict(self, budget):
+        """
+        Delete the least recently used entries of each namespace over its
+        share of budget bytes, then of the whole cache while it is over
+        budget. Returns the number deleted.
+        """
+        deleted = 0
+        for namespace in NAMESPACES.values():
+            if namespace.share is not None:
+                deleted += self._evict(budget * namespace.share, namespace.name)
+        return deleted + self._evict(budget)
+
+    def _evict(self, budget, namespace=None):
+        """Evict down to EVICTION_TARGET of budget once over budget."""
+        size = self.get_size(namespace)
+        if size <= budget:
+            return 0
+        where, params = "", ()
+        if namespace:
+            where, params = "WHERE namespace = ? ", (namespace,)
+        target = budget * EVICTION_TARGET
+        deleted = 0
+        while size > target:
+            rows = self._fetchall(
+                "SELECT key, LENGTH(data) FROM `cached` "
+                + where
+                + "ORDER BY last_access LIMIT ?",
+                params + (EVICTION_BATCH,),
+            )
+            if not rows:
+                break
+            keys = []
+            for key, length in rows:
+                keys.append(key)
+                size -= length
+                if size <= target:
+                    break
+            with self._lock:
+                self._conn.executemany(
+                    "DELETE FROM `cached` WHERE key = ?", [(key,) for key in keys]
+                )
+            for key in keys:
+                self._memory.delete(key)
+            deleted += len(keys)
+        return deleted
+
+    def vacuum(self, pages=VACUUM_PAGES):
+        """
+        Release up to pages free pages. A database made without incremental
+        auto_vacuum is converted by a full VACUUM instead, once.
+        """
+        if self._fetchone("PRAGMA auto_vacuum")[0] != 2:
+            with self._lock:
+                self._conn.execute("PRAGMA auto_vacuum=incremental")
+                self._conn.execute("VACUUM")
+            return
+        # incremental_vacuum frees pages as its rows are stepped through.
+        self._fetchall("PRAGMA incremental_vacuum({})".format(int(pages)))
+
+    def maintain(self, budget):
+        """Housekeeping of the maintenance service, never of a plugin call."""
+        self.flush_access()
+        self.clean_up()
+        evicted = self.evict(budget)
+        free_pages = self._fetchone("PRAGMA freelist_count")[0]
+        self.vacuum()
+        kodilog(
+            f"Cache maintenance: {evicted} evicted, {free_pages} free pages, "
+            f"{self.size} bytes"
+        )
+
+    def _check_legacy_keys(self):
+        """Stop looking up pickle_hash keys once they all moved or expired."""
+        legacy = self._fetchone(
+            "SELECT 1 FROM `cached` WHERE key GLOB ? LIMIT 1", (LEGACY_KEY_GLOB,)
+        )
+        if not legacy:
+            self._set_version(KEY_VERSION)
+            self._legacy_keys = False
+
+    def clean_all(self):
+        self._memory.clear()
+        self._execute("DELETE FROM cached")
+        self._check_legacy_keys()
 
     def close(self):
-        self._conn.close()
+        self.flush_access()
+        with self._lock:
+            self._conn.close()
 
 
 # A decorator for applying caching to functions
@@ -224,11 +638,19 @@ def cached(expiry_time, ignore_self=False, identifier="", cache_type=Cache):
         @wraps(func)
         def wrapper(*args, **kwargs):
             key_args = args[1:] if ignore_self else args
-            key = cache._generate_key((key_args, kwargs), identifier=identifier)
-            result = cache.get(key, default=sentinel, hashed_key=True)
+            key = call_key(key_args, kwargs)
+            result = cache.get(
+                key,
+                default=sentinel,
+                hashed_key=True,
+                identifier=identifier,
+                legacy=(key_args, kwargs),
+            )
             if result is sentinel:
                 result = func(*args, **kwargs)
-                cache.set(key, result, expiry_time, hashed_key=True)
+                cache.set(
+                    key, result, expiry_time, hashed_key=True, identifier=identifier
+                )
 
             return result
 
@@ -0,0 +1,115 @@
+import pickle
+import zlib
+
+
+# Blobs start with MAGIC, the codec version and a format byte. Pickles start
+# with their PROTO opcode, 0x80, so headerless blobs of older versions are
+# told apart and decoded as plain pickles.
+MAGIC = b"JC"
+VERSION = 2
+HEADER_SIZE = len(MAGIC) + 2
+
+PICKLE = 0
+ROWS = 1
+# Stale-while-revalidate entries, {"data": rows, "fresh_until": datetime}.
+SWR_ROWS = 2
+COMPRESSED = 0x80
+
+# Payloads above this size are compressed, when it makes them smaller.
+COMPRESS_THRESHOLD = 2048
+COMPRESS_LEVEL = 3
+# Shortest list of dicts stored in the row encoding.
+ROWS_MIN = 8
+
+
+def _is_rows(value):
+    return (
+        type(value) is list
+        and len(value) >= ROWS_MIN
+        and all(type(row) is dict for row in value)
+    )
+
+
+def _is_swr_rows(value):
+    return (
+        type(value) is dict
+        and value.keys() == {"data", "fresh_until"}
+        and _is_rows(value["data"])
+    )
+
+
+def _pack_rows(rows):
+    """
+    Lists of dicts sharing their keys, such as search results, stored as one
+    key list and a tuple of values per row. Rows lacking some of the keys
+    list the missing positions apart.
+    """
+    keys = list(dict.fromkeys(key for row in rows for key in row))
+    missing = {}
+    values = []
+    for i, row in enumerate(rows):
+        if len(row) != len(keys):
+            missing[i] = [j for j, key in enumerate(keys) if key not in row]
+        values.append(tuple([row.get(key) for key in keys]))
+    return keys, values, missing
+
+
+def _unpack_rows(packed):
+    keys, values, missing = packed
+    rows = [dict(zip(keys, row)) for row in values]
+    for i, positions in missing.items():
+        row = rows[i]
+        for j in positions:
+            del row[keys[j]]
+    return rows
+
+
+FORMATS = {
+    PICKLE: (pickle.dumps, pickle.loads),
+    ROWS: (
+        lambda value: pickle.dumps(_pack_rows(value)),
+        lambda data: _unpack_rows(pickle.loads(data)),
+    ),
+    SWR_ROWS: (
+        lambda value: pickle.dumps(
+            (_pack_rows(value["data"]), value["fresh_until"])
+        ),
+        lambda data: _unpack_swr_rows(*pickle.loads(data)),
+    ),
+}
+
+
+def _unpack_swr_rows(packed, fresh_until):
+    return {"data": _unpack_rows(packed), "fresh_until": fresh_until}
+
+
+def _format(value):
+    if _is_rows(value):
+        return ROWS
+    if _is_swr_rows(value):
+        return SWR_ROWS
+    return PICKLE
+
+
+def encode(value):
+    fmt = _format(value)
+    data = FORMATS[fmt][0](value)
+    if len(data) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        if len(compressed) < len(data):
+            data = compressed
+            fmt |= COMPRESSED
+    return MAGIC + bytes((VERSION, fmt)) + data
+
+
+def decode(blob):
+    blob = bytes(blob)
+    if blob[: len(MAGIC)] != MAGIC:
+        return pickle.loads(blob)
+    version, fmt = blob[len(MAGIC)], blob[len(MAGIC) + 1]
+    if version > VERSION:
+        raise ValueError("Cache blob of unknown codec version {}".format(version))
+    data = blob[HEADER_SIZE:]
+    if fmt & COMPRESSED:
+        data = zlib.decompress(data)
+    return FORMATS[fmt & ~COMPRESSED][1](data)
@@ -0,0 +1,412 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+
+from lib.db.cached import (
+    ADDON_DATA,
+    ADDON_ID,
+    CACHE_SQLITE_SETTINGS,
+    VACUUM_PAGES,
+)
+
+# SQLite limits the number of bound parameters of a statement.
+MAX_VARIABLES = 500
+UNCACHED_EXPIRATION = timedelta(hours=1)
+PACK_INDEX_EXPIRATION = timedelta(days=30)
+
+
+class DebridDatabase:
+    """
+    Debrid data shared across searches, keyed by infohash. The availability
+    table remembers, per debrid service, whether a hash was cached there,
+    rd_torrents mirrors the torrents of the Real-Debrid account and rd_played
+    when they were last played, links keeps unrestricted download links for
+    their lifetime and pack_files maps the episodes of resolved season packs
+    to their files.
+    """
+
+    def __init__(
+        self, database=os.path.join(ADDON_DATA, ADDON_ID + ".debrid.sqlite")
+    ):
+        self._conn = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        # As for the cache, expired rows are deleted by the maintenance job,
+        # which also releases their pages.
+        for k, v in CACHE_SQLITE_SETTINGS.items():
+            self._conn.execute("PRAGMA {}={}".format(k, v))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS `availability` ("
+            "service TEXT NOT NULL, "
+            "info_hash TEXT NOT NULL, "
+            "cached INTEGER NOT NULL, "
+            "expires TIMESTAMP NOT NULL, "
+            "PRIMARY KEY (service, info_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS `rd_torrents` ("
+            "id TEXT PRIMARY KEY NOT NULL, "
+            "info_hash TEXT NOT NULL, "
+            "status TEXT, "
+            "added TEXT"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS `rd_torrents_hash` ON `rd_torrents` (info_hash)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS `rd_played` ("
+            "info_hash TEXT PRIMARY KEY NOT NULL, "
+            "played REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS `links` ("
+            "service TEXT NOT NULL, "
+            "item_id TEXT NOT NULL, "
+            "file_id TEXT NOT NULL, "
+            "url TEXT NOT NULL, "
+            "expires TIMESTAMP NOT NULL, "
+            "PRIMARY KEY (service, item_id, file_id)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS `pack_files` ("
+            "show_id TEXT NOT NULL, "
+            "season INTEGER NOT NULL, "
+            "episode INTEGER NOT NULL, "
+            "service TEXT NOT NULL, "
+            "info_hash TEXT NOT NULL, "
+            "torrent_id TEXT NOT NULL, "
+            "file_id TEXT NOT NULL, "
+            "title TEXT NOT NULL, "
+            "indexed TIMESTAMP NOT NULL, "
+            "PRIMARY KEY (show_id, season, episode, service, info_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS `sync_state` ("
+            "name TEXT PRIMARY KEY NOT NULL, "
+            "value REAL NOT NULL"
+            ")"
+        )
+        self._lock = Lock()
+
+    def get_availability(self, service, info_hashes):
+        """Return {info_hash: cached} for the hashes with an unexpired entry."""
+        info_hashes = list({h for h in info_hashes if h})
+        now = datetime.utcnow()
+        known = {}
+        for i in range(0, len(info_hashes), MAX_VARIABLES):
+            chunk = info_hashes[i : i + MAX_VARIABLES]
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT info_hash, cached FROM `availability` "
+                    "WHERE service = ? AND expires > ? AND info_hash IN ({})".format(
+                        ",".join("?" * len(chunk))
+                    ),
+                    [service, now] + chunk,
+                ).fetchall()
+            known.update((info_hash, bool(cached)) for info_hash, cached in rows)
+        return known
+
+    def set_availability(self, service, availability, expiry_time):
+        """
+        Store {info_hash: cached}. Uncached hashes are kept for at most an
+        hour, they can become cached as soon as someone downloads them.
+        """
+        now = datetime.utcnow()
+        cached_expires = now + expiry_time
+        uncached_expires = now + min(expiry_time, UNCACHED_EXPIRATION)
+        rows = [
+            (
+                service,
+                info_hash,
+                int(cached),
+                cached_expires if cached else uncached_expires,
+            )
+            for info_hash, cached in availability.items()
+            if info_hash
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO `availability` "
+                    "(service, info_hash, cached, expires) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def lookup(self, service, info_hashes, fetch, expiry_time):
+        """
+        Availability of info_hashes on service. Only the hashes without an
+        unexpired entry are passed to fetch, which returns {info_hash: cached}.
+        """
+        known = self.get_availability(service, info_hashes)
+        unknown = list({h for h in info_hashes if h and h not in known})
+        if unknown:
+            fetched = fetch(unknown)
+            self.set_availability(service, fetched, expiry_time)
+            known.update(fetched)
+        return known
+
+    def get_link(self, service, item_id, file_id=""):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url FROM `links` WHERE service = ? AND item_id = ? "
+                "AND file_id = ? AND expires > ?",
+                (service, str(item_id), str(file_id), datetime.utcnow()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_link(self, service, item_id, file_id, url, expiry_time):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO `links` "
+                "(service, item_id, file_id, url, expires) VALUES (?, ?, ?, ?, ?)",
+                (
+                    service,
+                    str(item_id),
+                    str(file_id),
+                    url,
+                    datetime.utcnow() + expiry_time,
+                ),
+            )
+
+    def delete_link(self, url):
+        with self._lock:
+            self._conn.execute("DELETE FROM `links` WHERE url = ?", (url,))
+
+    def set_pack_files(self, show_id, service, info_hash, torrent_id, files):
+        """Index the (season, episode, file_id, title) files of a pack."""
+        now = datetime.utcnow()
+        rows = [
+            (
+                str(show_id),
+                season,
+                episode,
+                service,
+                info_hash,
+                str(torrent_id),
+                str(file_id),
+                title,
+                now,
+            )
+            for season, episode, file_id, title in files
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "DELETE FROM `pack_files` WHERE service = ? AND info_hash = ?",
+                    (service, info_hash),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO `pack_files` (show_id, season, episode, "
+                    "service, info_hash, torrent_id, file_id, title, indexed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_pack_file(self, show_id, season, episode, services):
+        """Most recently indexed pack file of the episode on one of services."""
+        if not services:
+            return
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT service, info_hash, torrent_id, file_id, title "
+                "FROM `pack_files` WHERE show_id = ? AND season = ? AND episode = ? "
+                "AND indexed > ? AND service IN ({}) "
+                "ORDER BY indexed DESC LIMIT 1".format(",".join("?" * len(services))),
+                [
+                    str(show_id),
+                    int(season),
+                    int(episode),
+                    datetime.utcnow() - PACK_INDEX_EXPIRATION,
+                ]
+                + list(services),
+            ).fetchone()
+        if row:
+            return dict(
+                zip(("service", "info_hash", "torrent_id", "file_id", "title"), row)
+            )
+
+    def delete_pack_files(self, service, info_hash):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM `pack_files` WHERE service = ? AND info_hash = ?",
+                (service, info_hash),
+            )
+
+    def get_rd_hashes(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT info_hash FROM `rd_torrents`").fetchall()
+        return {row[0] for row in rows}
+
+    def get_rd_torrent_ids(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM `rd_torrents`").fetchall()
+        return {row[0] for row in rows}
+
+    def get_rd_torrent(self, info_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, info_hash, status, added FROM `rd_torrents` "
+                "WHERE info_hash = ?",
+                (info_hash.lower(),),
+            ).fetchone()
+        if row:
+            return dict(zip(("id", "hash", "status", "added"), row))
+
+    def set_rd_torrents(self, torrents, replace=False):
+        """Insert or update account torrents, replace drops all the others."""
+        rows = [
+            (
+                str(t["id"]),
+                t["hash"].lower(),
+                t.get("status"),
+                t.get("added"),
+            )
+            for t in torrents
+            if t.get("id") and t.get("hash")
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if replace:
+                    self._conn.execute("DELETE FROM `rd_torrents`")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO `rd_torrents` "
+                    "(id, info_hash, status, added) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_rd_torrent(self, torrent_id):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM `rd_torrents` WHERE id = ?", (str(torrent_id),)
+            )
+
+    def set_rd_played(self, info_hash):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO `rd_played` (info_hash, played) VALUES (?, ?)",
+                (info_hash.lower(), time.time()),
+            )
+
+    def get_rd_eviction_order(self, info_hashes):
+        """
+        Account torrents of info_hashes, least recently played first, never
+        played ones by the date they were added.
+        """
+        info_hashes = [h.lower() for h in info_hashes if h][:MAX_VARIABLES]
+        if not info_hashes:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT t.id, t.info_hash FROM `rd_torrents` t "
+                "LEFT JOIN `rd_played` p ON p.info_hash = t.info_hash "
+                "WHERE t.info_hash IN ({}) "
+                "ORDER BY COALESCE(p.played, 0), t.added".format(
+                    ",".join("?" * len(info_hashes))
+                ),
+                info_hashes,
+            ).fetchall()
+        return [dict(zip(("id", "hash"), row)) for row in rows]
+
+    def get_rd_slots(self):
+        """(active, limit) of the last known active count, limit 0 if unknown."""
+        return (
+            int(self.get_sync_time("rd_active_nb")),
+            int(self.get_sync_time("rd_active_limit")),
+        )
+
+    def set_rd_slots(self, nb, limit):
+        self.set_sync_time("rd_active_nb", max(nb, 0))
+        self.set_sync_time("rd_active_limit", limit)
+
+    def clear_rd_torrents(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM `rd_torrents`")
+            self._conn.execute("DELETE FROM `rd_played`")
+            self._conn.execute("DELETE FROM `sync_state` WHERE name LIKE 'rd_%'")
+
+    def get_sync_time(self, name):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM `sync_state` WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_sync_time(self, name, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO `sync_state` (name, value) VALUES (?, ?)",
+                (name, value),
+            )
+
+    def clean_up(self):
+        now = datetime.utcnow()
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM `availability` WHERE expires <= ?", (now,)
+            )
+            self._conn.execute("DELETE FROM `links` WHERE expires <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM `pack_files` WHERE indexed <= ?",
+                (now - PACK_INDEX_EXPIRATION,),
+            )
+
+    def vacuum(self, pages=VACUUM_PAGES):
+        """
+        Release up to pages free pages. A database made without incremental
+        auto_vacuum is converted by a full VACUUM instead, once.
+        """
+        with self._lock:
+            if self._conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                self._conn.execute("PRAGMA auto_vacuum=incremental")
+                self._conn.execute("VACUUM")
+                return
+            # incremental_vacuum frees pages as its rows are stepped through.
+            self._conn.execute(
+                "PRAGMA incremental_vacuum({})".format(int(pages))
+            ).fetchall()
+
+    def maintain(self):
+        """Housekeeping of the maintenance service, never of a plugin call."""
+        self.clean_up()
+        self.vacuum()
+
+    def clean_all(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM `availability`")
+            self._conn.execute("DELETE FROM `links`")
+            self._conn.execute("DELETE FROM `pack_files`")
+        # Takes the lock itself, it is not reentrant.
+        self.clear_rd_torrents()
+
+    def close(self):
+        self._conn.close()
+
+
+debrid_db = DebridDatabase()
@@ -83,13 +83,14 @@ _mock_information = {
 }
 
 
-def source_select(item_info, xml_file, sources):
+def source_select(item_info, xml_file, sources, stream=None):
     window = SourceSelect(
         xml_file,
         ADDON_PATH,
         item_information=item_info,
         sources=sources,
         uncached=sources,
+        stream=stream,
     )
     data = window.doModal()
     del window
@@ -15,6 +15,7 @@ class ResolverWindow(BaseWindow):
         item_information=None,
         previous_window = None,
         close_callback=None,
+        preresolver=None,
     ):
         super().__init__(xml_file, location, item_information=item_information)
         self.stream_data = None
@@ -27,6 +28,7 @@ class ResolverWindow(BaseWindow):
         self.playback_info = None
         self.pack_data = None
         self.previous_window = previous_window
+        self.preresolver = preresolver
         self.setProperty("enable_busy_spinner", "false")
 
     def doModal(
@@ -79,6 +81,9 @@ class ResolverWindow(BaseWindow):
         return self.playback_info
 
     def resolve_single_source(self, url, magnet, is_torrent):
+        resolved_url = None
+        if self.preresolver and not self.pack_select:
+            resolved_url = self.preresolver.get(self.source)
         self.playback_info = get_playback_info(
             data={
                 "title": self.source["title"],
@@ -89,6 +94,7 @@ class ResolverWindow(BaseWindow):
                 "info_hash": self.source.get("infoHash", ""),
                 "is_torrent": is_torrent,
                 "is_pack": self.pack_select,
+                "resolved_url": resolved_url,
                 "mode": self.item_information["mode"],
                 "ids": self.item_information["ids"],
                 "tv_data": self.item_information["tv_data"],
@@ -99,6 +105,7 @@ class ResolverWindow(BaseWindow):
         self.pack_data = get_pack_info(
             type=self.source.get("type"),
             info_hash=self.source.get("infoHash"),
+            ids=self.item_information.get("ids"),
         )
 
         self.window = SourcePackSelect(
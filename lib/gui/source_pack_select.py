@@ -37,6 +37,7 @@ class SourcePackSelect(SourcePackWindow):
                 data={
                     "title": name,
                     "type": self.source["type"],
+                    "info_hash": self.source.get("infoHash", ""),
                     "is_torrent": False,
                     "is_pack": True,
                     "pack_info": {
@@ -1,10 +1,11 @@
+from threading import Lock
 import xbmcgui
 from lib.gui.base_window import BaseWindow
 from lib.gui.resolver_window import ResolverWindow
 from lib.gui.resume_window import ResumeDialog
 from lib.utils.kodi_utils import ADDON_PATH
-from lib.utils.debrid_utils import get_debrid_status
-from lib.utils.kodi_utils import bytes_to_human_readable
+from lib.utils.debrid_utils import PreResolver, get_debrid_status
+from lib.utils.kodi_utils import bytes_to_human_readable, get_setting
 from lib.utils.utils import (
     extract_publish_date,
     get_colored_languages,
@@ -14,12 +15,21 @@ from lib.utils.utils import (
 
 class SourceSelect(BaseWindow):
     def __init__(
-        self, xml_file, location, item_information=None, sources=None, uncached=None
+        self,
+        xml_file,
+        location,
+        item_information=None,
+        sources=None,
+        uncached=None,
+        stream=None,
     ):
         super().__init__(xml_file, location, item_information=item_information)
         self.uncached_sources = uncached or []
         self.position = -1
         self.sources = sources
+        self.stream = stream
+        self.preresolver = None
+        self.sources_lock = Lock()
         self.item_information = item_information
         self.playback_info = None
         self.resume = None
@@ -31,46 +41,86 @@ class SourceSelect(BaseWindow):
 
     def onInit(self):
         self.display_list = self.getControlList(1000)
-        self.populate_sources_list()
+        with self.sources_lock:
+            if self.stream:
+                self.sources = self.stream.attach(self)
+            self.populate_sources_list()
+            if get_setting("debrid_preresolve"):
+                self.preresolver = PreResolver(
+                    int(get_setting("debrid_preresolve_count", 2))
+                ).add(self.sources)
         self.set_default_focus(self.display_list, 1000, control_list_reset=True)
         super().onInit()
 
     def doModal(self):
-        super().doModal()
+        try:
+            super().doModal()
+        finally:
+            if self.stream:
+                self.stream.detach()
+            if self.preresolver:
+                self.preresolver.stop()
         return self.playback_info
 
     def populate_sources_list(self):
         self.display_list.reset()
 
         for source in self.sources:
-            menu_item = xbmcgui.ListItem(label=f"{source['title']}")
-
-            for info in source:
-                value = source[info]
-                if info == "publishDate":
-                    value = extract_publish_date(value)
-                if info == "size":
-                    value = bytes_to_human_readable(int(value))
-                if info in ["indexer", "provider", "type"]:
-                    color = get_random_color(value)
-                    value = f"[B][COLOR {color}]{value}[/COLOR][/B]"
-                if info == "fullLanguages":
-                    value = get_colored_languages(value)
-                    if len(value) <= 0:
-                        value = ""
-                if info == "isCached":
-                    info = "status"
-                    value = get_debrid_status(source)
-
-                menu_item.setProperty(info, str(value))
-
-            self.display_list.addItem(menu_item)
+            self.display_list.addItem(self.make_source_item(source))
+
+    def set_sources(self, sources):
+        """
+        Show the ranked sources again after a streamed batch was merged in,
+        keeping the selected source selected.
+        """
+        with self.sources_lock:
+            position = self.display_list.getSelectedPosition()
+            selected = None
+            if 0 <= position < len(self.sources):
+                selected = self.sources[position]
+            self.sources = sources
+            self.populate_sources_list()
+            for index, source in enumerate(sources):
+                if source is selected:
+                    self.display_list.selectItem(index)
+                    break
+            if self.preresolver:
+                self.preresolver.add(sources)
+
+    def make_source_item(self, source):
+        menu_item = xbmcgui.ListItem(label=f"{source['title']}")
+
+        for info in source:
+            value = source[info]
+            if info == "publishDate":
+                value = extract_publish_date(value)
+            if info == "size":
+                value = bytes_to_human_readable(int(value))
+            if info in ["indexer", "provider", "type"]:
+                color = get_random_color(value)
+                value = f"[B][COLOR {color}]{value}[/COLOR][/B]"
+            if info == "fullLanguages":
+                value = get_colored_languages(value)
+                if len(value) <= 0:
+                    value = ""
+            if info == "isCached":
+                info = "status"
+                value = get_debrid_status(source)
+
+            menu_item.setProperty(info, str(value))
+
+        return menu_item
 
     def handle_action(self, action_id, control_id=None):
-        self.position = self.display_list.getSelectedPosition()
+        # set_sources may replace the list in between, the position and the
+        # source are read together.
+        with self.sources_lock:
+            self.position = self.display_list.getSelectedPosition()
+            if not 0 <= self.position < len(self.sources):
+                return
+            selected_source = self.sources[self.position]
 
         if action_id == 117:
-            selected_source = self.sources[self.position]
             type = selected_source["type"]
             if type == "Torrent":
                 response = xbmcgui.Dialog().contextmenu(["Download to Debrid"])
@@ -87,7 +137,7 @@ class SourceSelect(BaseWindow):
             if control_id == 1000:
                 control_list = self.getControl(control_id)
                 self.set_cached_focus(control_id, control_list.getSelectedPosition())
-                self._resolve_item(pack_select=False)
+                self._resolve_item(selected_source, pack_select=False)
 
     def _download_into(self):
         pass
@@ -95,17 +145,16 @@ class SourceSelect(BaseWindow):
     def _resolve_pack(self):
         pass
 
-    def _resolve_item(self, pack_select):
+    def _resolve_item(self, selected_source, pack_select):
         self.setProperty("resolving", "true")
 
-        selected_source = self.sources[self.position]
-
         resolver_window = ResolverWindow(
             "resolver.xml",
             ADDON_PATH,
             source=selected_source,
             previous_window=self,
             item_information=self.item_information,
+            preresolver=self.preresolver,
         )
         resolver_window.doModal(pack_select)
         self.playback_info = resolver_window.playback_info
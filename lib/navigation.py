@@ -7,6 +7,7 @@ from urllib.parse import quote
 from lib.clients.debrid.premiumize import Premiumize
 from lib.clients.debrid.realdebrid import RealDebrid
 from lib.clients.debrid.torbox import Torbox
+from lib.clients.debrid.debrid_client import ProviderException
 from lib.api.jacktook.kodi import kodilog
 from lib.api.jacktorr_api import TorrServer
 from lib.api.tmdbv3api.tmdb import TMDb
@@ -28,6 +29,7 @@ from lib.api.trakt.trakt_api import (
     trakt_revoke_authentication,
 )
 from lib.clients.search import search_client
+from lib.stream import SourceStream
 from lib.files_history import last_files
 from lib.play import get_playback_info
 from lib.titles_history import last_titles
@@ -40,7 +42,7 @@ from lib.trakt import (
 
 from lib.utils.rd_utils import get_rd_info
 from lib.utils.items_menus import tv_items, movie_items, anime_items, animation_items
-from lib.utils.debrid_utils import check_debrid_cached
+from lib.utils.debrid_utils import check_debrid_cached, find_pack_episode, forget_pack
 
 from lib.tmdb import (
     handle_tmdb_anime_query,
@@ -49,12 +51,15 @@ from lib.tmdb import (
     tmdb_search_year,
 )
 from lib.db.cached import cache
+from lib.db.debrid_db import debrid_db
 
 from lib.utils.utils import (
     TMDB_POSTER_URL,
     DialogListener,
     Players,
     clean_auto_play_undesired,
+    get_auto_play_candidates,
+    has_enough_auto_play_sources,
     clear,
     clear_all_cache,
     get_fanart_details,
@@ -85,6 +90,7 @@ from lib.utils.kodi_utils import (
     build_url,
     cancel_playback,
     container_update,
+    dialog_text,
     play_media,
     show_keyboard,
     burst_addon_settings,
@@ -531,6 +537,60 @@ def search(params):
         except ValueError:
             pass
 
+    # Only the next episodes queued by the player keep playing from the same
+    # pack, any other search shows its sources as usual.
+    if (
+        mode == "tv"
+        and ids
+        and tv_data
+        and params.get("next_episode")
+        and get_setting("debrid_pack_index")
+        and not torrent_enabled()
+    ):
+        if play_indexed_episode(ids, tv_data, mode, season, episode):
+            return
+
+    if is_auto_play() and get_setting("auto_play_early_exit") and not torrent_enabled():
+        stream = SourceStream(
+            query,
+            ids,
+            mode,
+            media_type,
+            rescrape,
+            season,
+            episode,
+            ep_name,
+            stop_when=has_enough_auto_play_sources,
+        ).start()
+        sources = stream.wait_finished()
+        if not sources:
+            notification("No cached results found")
+            return
+        # The stream ranked the sources already, play the best one meeting
+        # the thresholds the search was stopped on.
+        candidates = get_auto_play_candidates(sources)
+        if candidates:
+            play_auto_play_result(candidates[0], ids, tv_data, mode)
+        else:
+            auto_play(sources, ids, tv_data, mode)
+        return
+
+    if is_stream_search():
+        stream = SourceStream(
+            query, ids, mode, media_type, rescrape, season, episode, ep_name
+        ).start()
+        if not stream.wait_first_batch():
+            notification("No results found")
+            return
+        data = handle_results([], mode, ids, tv_data, direct, stream=stream)
+        if not data:
+            cancel_playback()
+            return
+        player = JacktookPLayer(db=bookmark_db)
+        player.run(data=data)
+        del player
+        return
+
     with DialogListener() as listener:
         results = search_client(
             query, ids, mode, media_type, listener.dialog, rescrape, season, episode
@@ -583,7 +643,52 @@ def search(params):
     del player
 
 
-def handle_results(results, mode, ids, tv_data, direct=False):
+def torrent_enabled():
+    return get_setting("torrent_enable")
+
+
+def is_stream_search():
+    return get_setting("indexers_stream_results") and not is_auto_play()
+
+
+def play_indexed_episode(ids, tv_data, mode, season, episode):
+    pack_file = find_pack_episode(ids, season, episode)
+    if not pack_file:
+        return False
+
+    kodilog(f"Playing S{season}E{episode} from cloud pack {pack_file['info_hash']}")
+    try:
+        data = get_playback_info(
+            data={
+                "title": pack_file["title"],
+                "type": pack_file["service"],
+                "info_hash": pack_file["info_hash"],
+                "is_torrent": False,
+                "is_pack": True,
+                "pack_info": {
+                    "file_id": pack_file["file_id"],
+                    "torrent_id": pack_file["torrent_id"],
+                },
+                "mode": mode,
+                "ids": ids,
+                "tv_data": tv_data,
+            }
+        )
+    except (ProviderException, IndexError, KeyError) as e:
+        kodilog(f"Failed to play from cloud pack: {e}")
+        data = None
+    if not data:
+        # The pack is gone from the cloud, search the usual way.
+        forget_pack(pack_file)
+        return False
+
+    player = JacktookPLayer(db=bookmark_db)
+    player.run(data=data)
+    del player
+    return True
+
+
+def handle_results(results, mode, ids, tv_data, direct=False, stream=None):
     if direct:
         item_info = {"tv_data": tv_data, "ids": ids, "mode": mode}
     else:
@@ -614,6 +719,7 @@ def handle_results(results, mode, ids, tv_data, direct=False):
         item_info,
         xml_file=xml_file_string,
         sources=results,
+        stream=stream,
     )
 
 
@@ -646,7 +752,10 @@ def play_torrent(params):
 
 
 def auto_play(results, ids, tv_data, mode):
-    result = clean_auto_play_undesired(results)
+    play_auto_play_result(clean_auto_play_undesired(results), ids, tv_data, mode)
+
+
+def play_auto_play_result(result, ids, tv_data, mode):
     playback_info = get_playback_info(
         data={
             "title": result.get("title"),
@@ -950,9 +1059,37 @@ def files(params):
 
 def clear_all_cached(params):
     clear_all_cache()
+    debrid_db.clean_all()
     notification(translation(30244))
 
 
+def clear_cached_namespace(params):
+    """Drop one namespace of the cache, or only its keys starting with prefix."""
+    deleted = cache.invalidate(params["namespace"], params.get("prefix", ""))
+    notification(f"{deleted} cached entries cleared")
+
+
+def cache_stats(params):
+    body = []
+    for namespace, stats in cache.namespace_stats().items():
+        body.append(
+            "[B]{}:[/B] {} entries, {:.1f} MB, {} hits, {} misses".format(
+                namespace.capitalize(),
+                stats["entries"],
+                stats["bytes"] / (1024 * 1024),
+                stats["hits"],
+                stats["misses"],
+            )
+        )
+    memory = cache.memory_stats()
+    body.append(
+        "[B]Memory tier:[/B] {} hits, {} misses".format(
+            memory["hits"], memory["misses"]
+        )
+    )
+    dialog_text("Cache", "\n".join(body))
+
+
 def rd_auth(params):
     rd_client = RealDebrid(token=get_setting("real_debrid_token"))
     rd_client.auth()
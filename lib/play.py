@@ -1,4 +1,5 @@
 from urllib.parse import quote
+from lib.db.debrid_db import debrid_db
 from lib.utils.debrid_utils import get_debrid_direct_url, get_debrid_pack_direct_url
 from lib.utils.kodi_utils import (
     get_setting,
@@ -28,6 +29,8 @@ def get_playback_info(data):
     is_torrent = data.get("is_torrent", "")
     ids = data.get("ids", [])
     is_pack = data.get("is_pack", False)
+    # Link prepared by the pre-resolver while the source list was shown.
+    resolved_url = data.pop("resolved_url", None)
 
     torrent_enable = get_setting("torrent_enable")
     torrent_client = get_setting("torrent_client")
@@ -65,13 +68,19 @@ def get_playback_info(data):
                 else:
                     _url = url
             else:
-                _url = get_debrid_direct_url(data.get("info_hash", ""), type)
+                _url = resolved_url or get_debrid_direct_url(
+                    data.get("info_hash", ""), type
+                )
                 if not _url:
                     notification("File not cached")
                     return
 
     if _url:
         data["url"] = _url
+        # Played torrents are the last ones the slot manager removes, only
+        # count a pick to play, not a pre-resolved link.
+        if type == Debrids.RD and data.get("info_hash"):
+            debrid_db.set_rd_played(data["info_hash"])
     else:
         data["url"] = addon_url
 
@@ -15,6 +15,7 @@ from lib.utils.kodi_utils import (
     notification,
     set_property,
 )
+from lib.utils.debrid_utils import invalidate_debrid_link
 from lib.utils.tmdb_utils import tmdb_get
 from lib.utils.utils import (
     make_listing,
@@ -92,6 +93,8 @@ class JacktookPLayer(xbmc.Player):
             else:
                 if self.cancel_all_playback:
                     self.kill_dialog()
+                else:
+                    invalidate_debrid_link(self.url)
                 self.stop()
 
         except Exception as e:
@@ -221,6 +224,7 @@ class JacktookPLayer(xbmc.Player):
                         ids=ids,
                         tv_data=tv_data,
                         rescrape=True,
+                        next_episode=True,
                     )
 
                     list_item = ListItem(label=label)
@@ -285,6 +289,7 @@ class JacktookPLayer(xbmc.Player):
         setResolvedUrl(ADDON_HANDLE, False, ListItem(offscreen=True))
 
     def run_error(self):
+        invalidate_debrid_link(self.url)
         self.playback_successful = False
         self.clear_playback_properties()
         self.cancel_playback()
@@ -42,6 +42,10 @@ class ProviderListenerDialog(ProviderListener):
             self._dialog.close()
 
 
+# Seconds the Burst providers get to answer a search.
+PROVIDERS_TIMEOUT = 30
+
+
 def run_providers_method(timeout, method, *args, **kwargs):
     providers = get_providers()
     if not providers:
@@ -62,7 +66,7 @@ def run_provider_method(provider, timeout, method, *args, **kwargs):
 
 def get_providers_results(method, *args, **kwargs):
     results = []
-    data = run_providers_method(30, method, *args, **kwargs)
+    data = run_providers_method(PROVIDERS_TIMEOUT, method, *args, **kwargs)
     for provider, provider_results in data.items():
         if not isinstance(provider_results, (tuple, list)):
             logging.error(
@@ -95,6 +99,8 @@ def search(method, *args, **kwargs):
         notification("No providers available")
     else:
         notification("No results found!")
+        # An empty answer, unlike None which means the search failed.
+        return results
 
 
 def burst_search(query):
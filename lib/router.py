@@ -1,5 +1,6 @@
 import sys
 from urllib import parse
+from lib.db.cached import cache
 from lib.gui.custom_dialogs import run_next_dialog, run_resume_dialog
 from lib.navigation import (
     addon_update,
@@ -8,7 +9,9 @@ from lib.navigation import (
     anime_item,
     anime_menu,
     anime_search,
+    cache_stats,
     clear_all_cached,
+    clear_cached_namespace,
     clear_history,
     cloud,
     cloud_details,
@@ -61,6 +64,7 @@ from lib.utils.torrent_utils import (
     torrent_action,
     torrent_files,
 )
+from lib.utils.utils import run_revalidations
 
 
 def addon_router():
@@ -97,6 +101,8 @@ def addon_router():
         "history": history,
         "donate": donate,
         "clear_all_cached": clear_all_cached,
+        "clear_cached_namespace": clear_cached_namespace,
+        "cache_stats": cache_stats,
         "clear_history": clear_history,
         "addon_update": addon_update,
         "open_burst_config": open_burst_config,
@@ -130,6 +136,8 @@ def addon_router():
         action_func = actions.get(action)
         if action_func:
             action_func(params)
+            run_revalidations()
+            cache.flush_access()
             return
 
     root_menu()
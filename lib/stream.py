@@ -0,0 +1,158 @@
+from threading import Event, Lock, Thread
+
+from lib.api.jacktook.kodi import kodilog
+from lib.clients.search import search_client
+from lib.utils.debrid_utils import check_debrid_cached
+from lib.utils.kodi_utils import get_setting
+from lib.utils.utils import (
+    DialogListener,
+    get_dedup_key,
+    post_process,
+    pre_process,
+    rank_sources,
+    remove_duplicate,
+)
+
+
+class SourceStream:
+    """
+    Runs a search in a background thread and processes each indexer answer
+    as soon as it arrives, so the source list can be shown before the slowest
+    indexer is done. Each batch is ranked together with the sources already
+    found, so the list ends up as a full search would rank it. A listener (the
+    SourceSelect window) receives the whole ranked list through its
+    set_sources method after every batch. When stop_when(sources) returns
+    True the remaining indexers and debrid checks are abandoned.
+    """
+
+    def __init__(
+        self,
+        query,
+        ids,
+        mode,
+        media_type,
+        rescrape,
+        season,
+        episode,
+        ep_name,
+        stop_when=None,
+    ):
+        self.query = query
+        self.ids = ids
+        self.mode = mode
+        self.media_type = media_type
+        self.rescrape = rescrape
+        self.season = season
+        self.episode = episode
+        self.ep_name = ep_name
+        self.stop_when = stop_when
+        self.sources = []
+        self.listener = None
+        self.dialog = None
+        self.lock = Lock()
+        self.first_batch = Event()
+        self.finished = Event()
+        self._seen = set()
+
+    def start(self):
+        Thread(target=self._run, daemon=True).start()
+        return self
+
+    def wait_finished(self):
+        self.finished.wait()
+        with self.lock:
+            return list(self.sources)
+
+    def wait_first_batch(self):
+        """Block until the first usable sources are ready or the search ends."""
+        self.first_batch.wait()
+        with self.lock:
+            return list(self.sources)
+
+    def attach(self, listener):
+        with self.lock:
+            self.listener = listener
+            return list(self.sources)
+
+    def detach(self):
+        with self.lock:
+            self.listener = None
+
+    def _run(self):
+        try:
+            with DialogListener() as dialog_listener:
+                self.dialog = dialog_listener.dialog
+                search_client(
+                    self.query,
+                    self.ids,
+                    self.mode,
+                    self.media_type,
+                    self.dialog,
+                    self.rescrape,
+                    self.season,
+                    self.episode,
+                    on_results=self._on_results,
+                )
+        except Exception as e:
+            kodilog(f"Source stream failed: {e}")
+        finally:
+            self.finished.set()
+            self.first_batch.set()
+
+    def _on_results(self, indexer_key, results):
+        batch = self._process(results)
+        if not batch:
+            return
+
+        with self.lock:
+            # The total results limit applies to the best of the union, not to
+            # whatever answered first.
+            self.sources = rank_sources(self.sources + batch)
+            sources = list(self.sources)
+            listener = self.listener
+
+        self.first_batch.set()
+        if listener:
+            listener.set_sources(sources)
+
+        if self.stop_when:
+            with self.lock:
+                return self.stop_when(self.sources)
+
+    def _process(self, results):
+        # Sources already shown can not be merged any more, later duplicates
+        # of them are dropped.
+        fresh = []
+        for res in remove_duplicate(results):
+            key = get_dedup_key(res)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            fresh.append(res)
+        if not fresh:
+            return []
+
+        proc_results = pre_process(
+            fresh, self.mode, self.ep_name, self.episode, self.season
+        )
+        if not proc_results:
+            return []
+
+        if get_setting("torrent_enable"):
+            return post_process(proc_results)
+
+        # No query, the per search debrid cache is written by the full search.
+        debrid_cached = check_debrid_cached(
+            None,
+            proc_results,
+            self.mode,
+            self.media_type,
+            self.dialog,
+            True,
+            self.episode,
+        )
+        if not debrid_cached:
+            if not get_setting("jackgram_enabled"):
+                return []
+            return post_process(proc_results, self.season)
+        return post_process(debrid_cached, self.season)
@@ -51,7 +51,7 @@ def get_ad_pack_link(file_id, torrent_id):
 
 
 def get_ad_pack_info(info_hash):
-    info = get_cached(info_hash)
+    info = get_cached(info_hash, namespace="debrid")
     if info:
         return info
     torrent_info = add_ad_torrent(info_hash)
@@ -71,7 +71,7 @@ def get_ad_pack_info(info_hash):
                 title = f"[B][COLOR {tracker_color}][AD-Cached][/COLOR][/B]-{name}"
                 files.append((id, title))
             info["files"] = files
-            set_cached(info, info_hash)
+            set_cached(info, info_hash, namespace="debrid")
             return info
         else:
             notification("Not a torrent pack")
@@ -49,7 +49,7 @@ def search_anilist(category, page, plugin):
 
 
 def search_anilist_api(type, client, page):
-    cached_results = get_cached(type, params=(page))
+    cached_results = get_cached(type, params=(page), namespace="metadata")
     if cached_results:
         return cached_results
 
@@ -58,7 +58,7 @@ def search_anilist_api(type, client, page):
     elif type == "Popular":
         data = client.get_popular(page=page, perPage=10)
 
-    set_cached(data, type, params=(page))
+    set_cached(data, type, params=(page), namespace="metadata")
     return data
 
 
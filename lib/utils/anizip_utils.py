@@ -13,14 +13,14 @@ def search_anizip_episodes(title, anilist_id, plugin):
 
 
 def search_anizip_api(anilist_id):
-    cached_results = get_cached(type, params=(anilist_id))
+    cached_results = get_cached(type, params=(anilist_id), namespace="metadata")
     if cached_results:
         return cached_results
 
     anizip = AniZipApi()
     res = anizip.episodes(anilist_id)
 
-    set_cached(res, type, params=(anilist_id))
+    set_cached(res, type, params=(anilist_id), namespace="metadata")
     return res
 
 
@@ -1,10 +1,17 @@
 import copy
 import requests
-from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock, Thread
+from time import time
 from lib.api.jacktook.kodi import kodilog
+from lib.clients.debrid.transport import get_transport_stats
+from lib.db.debrid_db import debrid_db
 from lib.utils.ed_utils import check_ed_cached, get_ed_link, get_ed_pack_info
 from lib.utils.kodi_utils import get_setting
+from lib.utils.settings import get_int_setting
 from lib.utils.pm_utils import check_pm_cached, get_pm_link, get_pm_pack_info
+from lib.utils.release_parser import parse_release
 from lib.utils.rd_utils import (
     check_rd_cached,
     get_rd_link,
@@ -22,100 +29,195 @@ from lib.utils.utils import (
     USER_AGENT_HEADER,
     Debrids,
     Indexer,
-    get_cached,
+    NullDialog,
+    check_debrid_enabled,
+    get_dedup_key,
     get_info_hash_from_magnet,
+    get_negative_cached,
+    get_swr_cached,
     is_ed_enabled,
     is_pm_enabled,
     is_rd_enabled,
     is_tb_enabled,
     is_url,
-    set_cached,
+    revalidate_later,
+    set_negative_cached,
+    set_swr_cached,
     dialog_update,
 )
 
 
 def check_debrid_cached(query, results, mode, media_type, dialog, rescrape, episode=1):
+    if mode == "tv" or media_type == "tv":
+        params = (episode, "deb")
+    else:
+        params = "deb"
+
     if not rescrape:
         debrid_cached_check = get_setting("debrid_cached_check")
         if debrid_cached_check:
             if query:
-                if mode == "tv" or media_type == "tv":
-                    cached_results = get_cached(query, params=(episode, "deb"))
-                else:
-                    cached_results = get_cached(query, params=("deb"))
-
+                negative = get_negative_cached(query, params=params, namespace="debrid")
+                if negative and set(enabled_debrids()) <= set(negative["debrids"]):
+                    return []
+                cached_results, stale = get_swr_cached(
+                    query, params=params, namespace="debrid"
+                )
                 if cached_results:
+                    if stale:
+                        revalidate_later(
+                            f"{query}|{params}",
+                            refresh_debrid_cached,
+                            query,
+                            params,
+                            copy.deepcopy(results),
+                        )
                     return cached_results
 
-    lock = Lock()
+    dialog.create("")
+    cached_results, answered = run_debrid_checks(results, dialog)
 
-    cached_results = []
-    uncached_results = []
-    telegram_results = []
+    if query:
+        store_debrid_cached(cached_results, answered, query, params)
 
-    total = len(results)
-    dialog.create("")
+    return cached_results
 
-    extract_infohash(results)
 
-    if is_rd_enabled():
-        check_rd_cached(
-            results,
-            cached_results,
-            uncached_results,
-            telegram_results,
-            total,
-            dialog,
-            lock,
+def refresh_debrid_cached(query, params, results):
+    cached_results, answered = run_debrid_checks(results, NullDialog())
+    store_debrid_cached(cached_results, answered, query, params)
+
+
+def store_debrid_cached(cached_results, answered, query, params):
+    """
+    Cache the outcome of run_debrid_checks. Results are only cached when every
+    enabled service answered, as a service that timed out or failed may still
+    have the sources cached. The negative entry lists the services that
+    answered, so it stops applying once another service is checked.
+    """
+    if cached_results:
+        if set(enabled_debrids()) <= set(answered):
+            set_swr_cached(cached_results, query, params=params, namespace="debrid")
+    elif answered:
+        set_negative_cached(
+            {"debrids": answered}, query, params=params, namespace="debrid"
         )
 
-    if is_tb_enabled():
-        check_torbox_cached(
-            results,
-            cached_results,
-            uncached_results,
-            telegram_results,
-            total,
-            dialog,
-            lock,
-        )
-    if is_pm_enabled():
-        check_pm_cached(
-            results,
-            cached_results,
-            uncached_results,
-            telegram_results,
-            total,
-            dialog,
-            lock,
-        )
 
-    if is_ed_enabled():
-        check_ed_cached(
-            results,
-            cached_results,
-            uncached_results,
-            telegram_results,
-            total,
-            dialog,
-            lock,
+def enabled_debrids():
+    return [debrid for debrid in Debrids.values() if check_debrid_enabled(debrid)]
+
+
+DEBRID_CHECKS = (
+    (Debrids.RD, is_rd_enabled, check_rd_cached),
+    (Debrids.TB, is_tb_enabled, check_torbox_cached),
+    (Debrids.PM, is_pm_enabled, check_pm_cached),
+    (Debrids.ED, is_ed_enabled, check_ed_cached),
+)
+
+
+def run_debrid_checks(results, dialog):
+    """
+    Check availability on every enabled debrid service at once. Each service
+    fills its own lists and gets debrid_check_timeout seconds, a service that
+    answers later is left out. Sources cached on several services are merged
+    into one, tagged with all of them in its debrids list. Returns the
+    results and the services whose check completed; a service whose check
+    raised, for instance on a failed availability chunk, keeps the sources it
+    listed but is not among them.
+    """
+    lock = Lock()
+    total = len(results)
+
+    extract_infohash(results)
+
+    checks = []
+    for debrid, is_enabled, check in DEBRID_CHECKS:
+        if not is_enabled():
+            continue
+        lists = {"cached": [], "uncached": [], "telegram": [], "done": False}
+        thread = Thread(
+            target=_debrid_check_worker,
+            args=(debrid, check, results, lists, total, dialog, lock),
+            daemon=True,
         )
+        thread.start()
+        checks.append((debrid, thread, lists))
+
+    deadline = time() + get_int_setting("debrid_check_timeout")
+    answered = []
+    finished = []
+    for debrid, thread, lists in checks:
+        thread.join(max(deadline - time(), 0))
+        if thread.is_alive():
+            kodilog(f"{debrid} availability check missed its deadline")
+            continue
+        finished.append(lists)
+        if lists["done"]:
+            answered.append(debrid)
+
+    cached_results = merge_debrid_results(
+        [res for lists in finished for res in lists["cached"]]
+    )
 
     if any([is_tb_enabled(), is_pm_enabled(), is_ed_enabled()]) and get_setting(
         "show_uncached"
     ):
-        cached_results.extend(uncached_results + telegram_results)
+        seen = {get_dedup_key(res) for res in cached_results}
+        for lists in finished:
+            for res in lists["uncached"]:
+                key = get_dedup_key(res)
+                if key not in seen:
+                    seen.add(key)
+                    cached_results.append(res)
+        # Every service only keeps the telegram results when none was kept yet.
+        for lists in finished:
+            if lists["telegram"]:
+                cached_results.extend(lists["telegram"])
+                break
 
     dialog_update["count"] = -1
     dialog_update["percent"] = 50
 
-    if query:
-        if mode == "tv" or media_type == "tv":
-            set_cached(cached_results, query, params=(episode, "deb"))
-        else:
-            set_cached(cached_results, query, params=("deb"))
+    kodilog(f"Debrid transport stats: {get_transport_stats()}")
+    return cached_results, answered
 
-    return cached_results
+
+def _debrid_check_worker(debrid, check, results, lists, total, dialog, lock):
+    try:
+        check(
+            results,
+            lists["cached"],
+            lists["uncached"],
+            lists["telegram"],
+            total,
+            dialog,
+            lock,
+        )
+        lists["done"] = True
+    except Exception as e:
+        kodilog(f"{debrid} availability check failed: {e}")
+
+
+def merge_debrid_results(results):
+    """
+    Merge the same source returned by several services. The first cached copy
+    is kept, debrids lists every service it is cached on.
+    """
+    merged = {}
+    for res in results:
+        key = get_dedup_key(res)
+        kept = merged.get(key)
+        debrids = [res["type"]] if res.get("isCached") else []
+        if kept is None:
+            res["debrids"] = debrids
+            merged[key] = res
+        elif res.get("isCached") and not kept.get("isCached"):
+            res["debrids"] = kept["debrids"] + debrids
+            merged[key] = res
+        elif res["type"] not in kept["debrids"]:
+            kept["debrids"].extend(debrids)
+    return list(merged.values())
 
 
 def get_debrid_status(res):
@@ -151,7 +253,7 @@ def get_rd_status_pack(res):
     return label
 
 
-def get_pack_info(type, info_hash):
+def get_pack_info(type, info_hash, ids=None):
     if type == Debrids.PM:
         info = get_pm_pack_info(info_hash)
     elif type == Debrids.TB:
@@ -161,11 +263,44 @@ def get_pack_info(type, info_hash):
     elif type == Debrids.ED:
         info = get_ed_pack_info(info_hash)
 
+    if info and ids and type in PACK_INDEX_SERVICES:
+        index_pack_files(type, info_hash, info, ids)
+
     return info
 
 
+# Premiumize and EasyDebrid packs list expiring links rather than file ids.
+PACK_INDEX_SERVICES = (Debrids.RD, Debrids.TB)
+
+
+def index_pack_files(type, info_hash, info, ids):
+    """Parse every file of a resolved pack once into its season and episode."""
+    tmdb_id = ids.split(", ")[0]
+    files = []
+    for file_id, title in info.get("files", []):
+        release = parse_release(title)
+        if len(release.seasons) == 1 and len(release.episodes) == 1:
+            files.append((release.seasons[0], release.episodes[0], file_id, title))
+    if files:
+        debrid_db.set_pack_files(tmdb_id, type, info_hash, info["id"], files)
+        kodilog(f"Indexed {len(files)} episodes of pack {info_hash}")
+
+
+def find_pack_episode(ids, season, episode):
+    """The episode file in an already resolved cloud pack, if any."""
+    tmdb_id = ids.split(", ")[0]
+    services = [debrid for debrid in PACK_INDEX_SERVICES if check_debrid_enabled(debrid)]
+    return debrid_db.get_pack_file(tmdb_id, season, episode, services)
+
+
+def forget_pack(pack_file):
+    debrid_db.delete_pack_files(pack_file["service"], pack_file["info_hash"])
+
+
 def extract_infohash(results):
-    for res in copy.deepcopy(results):
+    """Set a lowercase infoHash on every result, drop the ones without one."""
+    kept = []
+    for res in results:
         info_hash = None
         if res.get("infoHash"):
             info_hash = res["infoHash"].lower()
@@ -180,9 +315,10 @@ def extract_infohash(results):
 
         if info_hash:
             res["infoHash"] = info_hash
-        else:
-            if res["indexer"] != Indexer.TELEGRAM:
-                results.remove(res)
+            kept.append(res)
+        elif res["indexer"] == Indexer.TELEGRAM:
+            kept.append(res)
+    results[:] = kept
 
 
 def get_magnet_from_uri(uri):
@@ -205,7 +341,63 @@ def get_magnet_from_uri(uri):
     return magnet, info_hash
 
 
+# How long an unrestricted link is reused, under each provider's lifetime.
+LINK_LIFETIMES = {
+    Debrids.RD: timedelta(hours=6),
+    Debrids.PM: timedelta(hours=6),
+    Debrids.TB: timedelta(hours=1),
+    Debrids.ED: timedelta(hours=1),
+}
+LINK_CHECK_TIMEOUT = 5
+
+
+def get_cached_link(type, item_id, file_id, resolve):
+    """
+    Unrestricted link of (type, item_id, file_id), reused while it is within
+    the provider link lifetime and still answers a HEAD request.
+    """
+    url = debrid_db.get_link(type, item_id, file_id)
+    if url:
+        if is_link_alive(url):
+            kodilog(f"Reusing {type} link of {item_id}")
+            return url
+        debrid_db.delete_link(url)
+
+    url = resolve()
+    if url:
+        debrid_db.set_link(
+            type, item_id, file_id, url, LINK_LIFETIMES.get(type, timedelta(hours=1))
+        )
+    return url
+
+
+def is_link_alive(url):
+    try:
+        response = requests.head(
+            url,
+            timeout=LINK_CHECK_TIMEOUT,
+            allow_redirects=True,
+            headers=USER_AGENT_HEADER,
+        )
+    except requests.RequestException:
+        return False
+    # Some file hosts do not implement HEAD.
+    return response.status_code < 400 or response.status_code == 405
+
+
+def invalidate_debrid_link(url):
+    """Forget a cached link, after playback failed with it."""
+    if url:
+        debrid_db.delete_link(url)
+
+
 def get_debrid_direct_url(info_hash, type):
+    return get_cached_link(
+        type, info_hash, "", lambda: resolve_debrid_direct_url(info_hash, type)
+    )
+
+
+def resolve_debrid_direct_url(info_hash, type):
     if type == Debrids.RD:
         return get_rd_link(info_hash)
     elif type == Debrids.PM:
@@ -216,7 +408,91 @@ def get_debrid_direct_url(info_hash, type):
         return get_ed_link(info_hash)
 
 
+# Links resolved at the same time, the transport rate limits each provider.
+PRERESOLVE_WORKERS = 2
+PRERESOLVE_WAIT = 30
+
+
+class PreResolver:
+    """
+    Resolves the debrid links of the first cached sources in the background
+    while the source list is shown, so picking one of them is instant.
+    Packs are left out, they need a file to be chosen first. Real-Debrid
+    sources are only taken when already on the account, so no active
+    torrent slot is used or freed for them.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.lock = Lock()
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=PRERESOLVE_WORKERS)
+        self.stopped = False
+
+    def add(self, sources):
+        with self.lock:
+            for source in sources:
+                if self.stopped or len(self.pending) >= self.count:
+                    return self
+                key = self._key(source)
+                if key and key not in self.pending:
+                    self.pending[key] = self.executor.submit(
+                        self._resolve, source["infoHash"], source["type"]
+                    )
+        return self
+
+    def get(self, source, timeout=PRERESOLVE_WAIT):
+        """The resolved url of source, None if it was not pre-resolved."""
+        with self.lock:
+            future = self.pending.get(self._key(source))
+        if not future:
+            return
+        try:
+            return future.result(timeout)
+        except Exception as e:
+            kodilog(f"Pre-resolved link not available: {e}")
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            for future in self.pending.values():
+                future.cancel()
+        self.executor.shutdown(wait=False)
+
+    @staticmethod
+    def _key(source):
+        if (
+            source.get("type") in Debrids.values()
+            and source.get("isCached")
+            and not source.get("isPack")
+            and source.get("infoHash")
+        ):
+            # Some indexers (MediaFusion) mark sources cached on Real-Debrid
+            # without them being on the account.
+            if source["type"] == Debrids.RD and not debrid_db.get_rd_torrent(
+                source["infoHash"]
+            ):
+                return
+            return (source["type"], source["infoHash"])
+
+    @staticmethod
+    def _resolve(info_hash, type):
+        start = time()
+        url = get_debrid_direct_url(info_hash, type)
+        kodilog(f"Pre-resolved {type} {info_hash} in {time() - start:.1f}s")
+        return url
+
+
 def get_debrid_pack_direct_url(file_id, torrent_id, type):
+    return get_cached_link(
+        type,
+        torrent_id,
+        file_id,
+        lambda: resolve_debrid_pack_direct_url(file_id, torrent_id, type),
+    )
+
+
+def resolve_debrid_pack_direct_url(file_id, torrent_id, type):
     if type == Debrids.RD:
         return get_rd_pack_link(file_id, torrent_id)
     elif type == Debrids.TB:
@@ -0,0 +1,92 @@
+import binascii
+import re
+import unicodedata
+from base64 import b32decode
+
+
+MAGNET_BTIH = re.compile(r"[?&]xt=urn:btih:([0-9a-z]+)", re.IGNORECASE)
+
+
+def normalize_title(title):
+    """Lowercase, accent and punctuation free version of a title."""
+    normalized = unicodedata.normalize("NFKD", str(title).lower())
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", normalized).split())
+
+
+def magnet_info_hash(uri):
+    """
+    Lowercase hex infohash of a magnet link, base32 hashes are converted.
+    None when uri is not a magnet or carries no valid btih.
+    """
+    if not isinstance(uri, str) or not uri.startswith("magnet:"):
+        return None
+    match = MAGNET_BTIH.search(uri)
+    if not match:
+        return None
+    btih = match.group(1)
+    if len(btih) == 40:
+        try:
+            return bytes.fromhex(btih).hex()
+        except ValueError:
+            return None
+    if len(btih) == 32:
+        try:
+            return b32decode(btih.upper()).hex()
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+def get_dedup_key(res):
+    """
+    Identity of a release across indexers: the infoHash when known, or the
+    one carried by a magnet guid or magnetUrl (Jackett, Burst), then the
+    guid, then the normalized title and size.
+    """
+    info_hash = res.get("infoHash")
+    if info_hash:
+        return "hash:" + str(info_hash).strip().lower()
+    guid = res.get("guid")
+    info_hash = magnet_info_hash(guid) or magnet_info_hash(res.get("magnetUrl"))
+    if info_hash:
+        return "hash:" + info_hash
+    if guid:
+        return "guid:" + str(guid).strip()
+    return "title:{}:{}".format(normalize_title(res.get("title", "")), res.get("size"))
+
+
+def merge_duplicate(kept, res):
+    """Fold the metadata of a duplicate into the result that was kept."""
+    kept["seeders"] = max(kept.get("seeders") or 0, res.get("seeders") or 0)
+    kept["peers"] = max(kept.get("peers") or 0, res.get("peers") or 0)
+    for field in ("languages", "fullLanguages", "providers", "indexers"):
+        values = list(kept.get(field) or [])
+        values.extend(v for v in res.get(field) or [] if v not in values)
+        kept[field] = values
+
+
+def _with_sources(res):
+    res = dict(res)
+    if "providers" not in res:
+        res["providers"] = [res["provider"]] if res.get("provider") else []
+    if "indexers" not in res:
+        res["indexers"] = [res["indexer"]] if res.get("indexer") else []
+    return res
+
+
+def remove_duplicate(results):
+    """
+    Drop the same release returned by several indexers, in linear time.
+    Duplicates are merged: highest seeders, union of languages, and every
+    provider and indexer in the providers and indexers lists.
+    """
+    unique = {}
+    for res in results:
+        key = get_dedup_key(res)
+        kept = unique.get(key)
+        if kept is None:
+            unique[key] = _with_sources(res)
+        else:
+            merge_duplicate(kept, _with_sources(res))
+    return list(unique.values())
@@ -1,7 +1,9 @@
 import copy
 from lib.api.jacktook.kodi import kodilog
 from lib.clients.debrid.easydebrid import EasyDebrid
+from lib.db.debrid_db import debrid_db
 from lib.utils.kodi_utils import get_setting, notification
+from lib.utils.settings import get_debrid_availability_expiration
 from lib.utils.utils import (
     Debrids,
     Indexer,
@@ -20,13 +22,14 @@ client = EasyDebrid(token=get_setting("easydebrid_token"), user_ip=get_public_ip
 def check_ed_cached(
     results, cached_results, uncached_results, telegram_results, total, dialog, lock
 ):
-    filtered_results = [res for res in results if "infoHash" in res]
-    if filtered_results:
-        magnets = [info_hash_to_magnet(res["infoHash"]) for res in filtered_results]
-        torrents_info = client.get_torrent_instant_availability(magnets)
-        cached_response = torrents_info.get("cached", [])
+    availability = debrid_db.lookup(
+        Debrids.ED,
+        [res.get("infoHash") for res in results],
+        fetch_ed_availability,
+        get_debrid_availability_expiration(),
+    )
 
-    for res in results:
+    for res in copy.deepcopy(results):
         if res["indexer"] == Indexer.TELEGRAM:
             if telegram_results:
                 continue
@@ -37,19 +40,24 @@ def check_ed_cached(
         debrid_dialog_update("ED", total, dialog, lock)
         res["type"] = Debrids.ED
 
-        if res in filtered_results:
-            index = filtered_results.index(res)
-            if cached_response[index] is True:
-                res["isCached"] = True
-                cached_results.append(res)
-            else:
-                res["isCached"] = False
-                uncached_results.append(res)
+        if availability.get(res.get("infoHash")):
+            res["isCached"] = True
+            cached_results.append(res)
         else:
             res["isCached"] = False
             uncached_results.append(res)
 
 
+def fetch_ed_availability(hashes):
+    magnets = [info_hash_to_magnet(info_hash) for info_hash in hashes]
+    torrents_info = client.get_torrent_instant_availability(magnets)
+    cached_response = torrents_info.get("cached") or []
+    return {
+        info_hash: cached is True
+        for info_hash, cached in zip(hashes, cached_response)
+    }
+
+
 def get_ed_link(info_hash):
     kodilog("ed_utils::get_ed_link")
     magnet = info_hash_to_magnet(info_hash)
@@ -61,7 +69,7 @@ def get_ed_link(info_hash):
 
 
 def get_ed_pack_info(info_hash):
-    info = get_cached(info_hash)
+    info = get_cached(info_hash, namespace="debrid")
     if info:
         return info
     extensions = supported_video_extensions()[:-1]
@@ -77,7 +85,7 @@ def get_ed_pack_info(info_hash):
                 files.append((item["url"], name))
         info["files"] = files
         if info:
-            set_cached(info, info_hash)
+            set_cached(info, info_hash, namespace="debrid")
             return info
     else:
         notification("Not a torrent pack")
@@ -1,11 +1,14 @@
 import copy
 from lib.clients.debrid.premiumize import Premiumize
+from lib.db.debrid_db import debrid_db
 from lib.api.jacktook.kodi import kodilog
 from lib.utils.kodi_utils import get_setting, notification
+from lib.utils.settings import get_debrid_availability_expiration
 from lib.utils.utils import (
     Debrids,
     Indexer,
     debrid_dialog_update,
+    fetch_in_chunks,
     get_cached,
     get_random_color,
     info_hash_to_magnet,
@@ -20,11 +23,15 @@ pm_client = Premiumize(token=get_setting("premiumize_token"))
 def check_pm_cached(
     results, cached_results, uncached_results, telegram_results, total, dialog, lock
 ):
-    hashes = [res.get("infoHash") for res in results]
-    torrents_info = pm_client.get_torrent_instant_availability(hashes)
-    cached_response = torrents_info.get("response")
+    failed = []
+    availability = debrid_db.lookup(
+        Debrids.PM,
+        [res.get("infoHash") for res in results],
+        lambda hashes: fetch_pm_availability(hashes, failed),
+        get_debrid_availability_expiration(),
+    )
 
-    for e, res in enumerate(copy.deepcopy(results)):
+    for res in copy.deepcopy(results):
         if res["indexer"] == Indexer.TELEGRAM:
             if telegram_results:
                 continue
@@ -35,13 +42,43 @@ def check_pm_cached(
         debrid_dialog_update("PM", total, dialog, lock)
         res["type"] = Debrids.PM
 
-        if cached_response[e] is True:
+        if availability.get(res.get("infoHash")):
             res["isCached"] = True
             cached_results.append(res)
         else:
             res["isCached"] = False
             uncached_results.append(res)
 
+    # The sources are kept, but the check must not count as answered or its
+    # partial result would be cached as complete.
+    if failed:
+        raise PremiumizeException(
+            f"Premiumize availability of {len(failed)} hashes is unknown"
+        )
+
+
+# Hashes per cache/check request and requests in flight.
+PM_AVAILABILITY_CHUNK = 100
+PM_AVAILABILITY_WORKERS = 2
+
+
+def fetch_pm_availability(hashes, failed):
+    """Availability of hashes, the ones that could not be checked go to failed."""
+    availability, unchecked = fetch_in_chunks(
+        _fetch_pm_chunk, hashes, PM_AVAILABILITY_CHUNK, PM_AVAILABILITY_WORKERS
+    )
+    failed.extend(unchecked)
+    return availability
+
+
+def _fetch_pm_chunk(hashes):
+    torrents_info = pm_client.get_torrent_instant_availability(hashes)
+    cached_response = torrents_info.get("response") or []
+    return {
+        info_hash: cached is True
+        for info_hash, cached in zip(hashes, cached_response)
+    }
+
 
 def get_pm_link(infoHash):
     magnet = info_hash_to_magnet(infoHash)
@@ -55,7 +92,7 @@ def get_pm_link(infoHash):
 
 
 def get_pm_pack_info(info_hash):
-    info = get_cached(info_hash)
+    info = get_cached(info_hash, namespace="debrid")
     if info:
         return info
     extensions = supported_video_extensions()[:-1]
@@ -80,8 +117,14 @@ def get_pm_pack_info(info_hash):
                 files.append((item["link"], name))
         info["files"] = files
         if info:
-            set_cached(info, info_hash)
+            set_cached(info, info_hash, namespace="debrid")
             return info
     else:
         notification("Not a torrent pack")
         return
+
+
+class PremiumizeException(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
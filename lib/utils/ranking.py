@@ -0,0 +1,135 @@
+import heapq
+import re
+from operator import itemgetter
+
+from lib.utils.release_parser import RESOLUTION_RANK, parse_release
+
+
+# Names match the "Sort" setting values.
+RANK_FIELDS = ("Language", "Cached", "Quality", "Seeds", "Size", "Date")
+DEFAULT_RANK_ORDER = "Language,Cached,Quality,Seeds,Size,Date"
+
+# Below this share of the results, a heap selection of the shown rows is
+# cheaper than sorting everything.
+TOP_K_RATIO = 0.25
+
+_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+
+def _as_int(value):
+    if type(value) is int:
+        return value
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _date_rank(res):
+    match = _DATE.search(str(res.get("publishDate") or ""))
+    return -int("".join(match.groups())) if match else 0
+
+
+def set_rank_values(res, release=None):
+    """
+    Store the quality and date ranks of res in it, so ranking compares plain
+    values instead of parsing the title and date of every result again.
+    """
+    release = release or parse_release(res["title"])
+    res["qualityRank"] = RESOLUTION_RANK[release.resolution]
+    res["dateRank"] = _date_rank(res)
+    return res
+
+
+def _quality_rank(res):
+    rank = res.get("qualityRank")
+    if rank is None:
+        return RESOLUTION_RANK[parse_release(res["title"]).resolution]
+    return rank
+
+
+def _stored_date_rank(res):
+    rank = res.get("dateRank")
+    return _date_rank(res) if rank is None else rank
+
+
+def _field_getters(priority_lang):
+    return {
+        "Language": lambda res: 0 if priority_lang in (res.get("languages") or []) else 1,
+        "Cached": lambda res: 0 if res.get("isCached") else 1,
+        "Quality": _quality_rank,
+        "Seeds": lambda res: -_as_int(res.get("seeders")),
+        "Size": lambda res: -_as_int(res.get("size")),
+        "Date": _stored_date_rank,
+    }
+
+
+def parse_rank_order(order, sort_by=None, priority_lang=None):
+    """
+    Turn the comma separated rank order setting into a list of fields.
+    sort_by, when given, is moved to the front, behind Language when there
+    is a priority language. Language is dropped when there is none.
+    """
+    fields = [f.strip() for f in str(order or "").split(",")]
+    fields = [f for f in fields if f in RANK_FIELDS]
+    if sort_by in RANK_FIELDS:
+        fields = [sort_by] + [f for f in fields if f != sort_by]
+    if priority_lang:
+        fields = ["Language"] + [f for f in fields if f != "Language"]
+    else:
+        fields = [f for f in fields if f != "Language"]
+    return list(dict.fromkeys(fields))
+
+
+def make_rank_key(fields, priority_lang=None):
+    """Composite key, smaller is better, computed once per result."""
+
+    getters = _field_getters(priority_lang)
+    getters = [getters[field] for field in fields]
+
+    def rank_key(res):
+        return tuple([getter(res) for getter in getters])
+
+    return rank_key
+
+
+def _rank_order(fields, priority_lang):
+    return (tuple(fields), priority_lang)
+
+
+def set_rank_keys(results, fields, priority_lang=None):
+    """
+    Store the composite rank key of each result in it, along with the order
+    it was built for. Results already keyed for the same order are skipped,
+    so ranking a growing list again only keys the new results.
+    """
+    order = _rank_order(fields, priority_lang)
+    key = make_rank_key(fields, priority_lang)
+    for res in results:
+        if res.get("rankOrder") != order:
+            res["rankKey"] = key(res)
+            res["rankOrder"] = order
+    return results
+
+
+def rank_results(results, fields, limit=None, priority_lang=None):
+    """
+    Order results by fields and keep the first limit of them. The order is
+    stable, results ranking the same keep their incoming order. When every
+    result was keyed by set_rank_keys for these fields, the stored keys are
+    compared, otherwise keys are built on the fly. results is not changed.
+    """
+    if limit is not None and limit <= 0:
+        return []
+    if not fields:
+        return list(results[:limit]) if limit else list(results)
+
+    order = _rank_order(fields, priority_lang)
+    if all(res.get("rankOrder") == order for res in results):
+        key = itemgetter("rankKey")
+    else:
+        key = make_rank_key(fields, priority_lang)
+    if limit and limit < len(results) * TOP_K_RATIO:
+        return heapq.nsmallest(limit, results, key=key)
+    ranked = sorted(results, key=key)
+    return ranked[:limit] if limit else ranked
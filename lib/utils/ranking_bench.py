@@ -0,0 +1,82 @@
+"""
+Ranking benchmark on synthetic results, run from the addon root with:
+
+    python -m lib.utils.ranking_bench [count] [limit]
+"""
+
+import random
+import sys
+from timeit import timeit
+
+from lib.utils.ranking import (
+    parse_rank_order,
+    rank_results,
+    set_rank_keys,
+    set_rank_values,
+)
+
+
+RESOLUTIONS = ("2160p", "1080p", "720p", "480p", "")
+SOURCES = ("WEB-DL", "BluRay", "WEBRip", "HDTV", "")
+LANGUAGES = ("GB", "FR", "ES", "IT", "DE")
+
+
+def make_results(count, seed=0):
+    rnd = random.Random(seed)
+    results = []
+    for i in range(count):
+        results.append(
+            {
+                "title": "Show.S01E{:02}.{}.{}.x265-GRP{}".format(
+                    rnd.randint(1, 12),
+                    rnd.choice(RESOLUTIONS),
+                    rnd.choice(SOURCES),
+                    i,
+                ),
+                "seeders": rnd.randint(0, 5000),
+                "size": rnd.randint(10**8, 6 * 10**10),
+                "publishDate": "20{:02}-{:02}-{:02}".format(
+                    rnd.randint(10, 24), rnd.randint(1, 12), rnd.randint(1, 28)
+                ),
+                "languages": rnd.sample(LANGUAGES, rnd.randint(0, 2)),
+                "isCached": rnd.random() < 0.3,
+            }
+        )
+    return results
+
+
+def legacy_rank(results, limit, priority_lang):
+    """The previous post_process: language split, a full sort, then a slice."""
+    priority = [r for r in results if priority_lang in r["languages"]]
+    others = [r for r in results if priority_lang not in r["languages"]]
+    ranked = sorted(priority + others, key=lambda r: r["seeders"], reverse=True)
+    return ranked[:limit]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    results = make_results(count)
+    fields = parse_rank_order("Language,Cached,Quality,Seeds,Size,Date", None, "FR")
+
+    # Store the rank values, as pre_process does during a search.
+    for res in results:
+        set_rank_values(res)
+
+    runs = 10
+    keyed = set_rank_keys([dict(res) for res in results], fields, "FR")
+    cases = (
+        ("legacy sort + slice", lambda: legacy_rank(results, limit, "FR")),
+        ("rank_results top-k", lambda: rank_results(results, fields, limit, "FR")),
+        ("rank_results full", lambda: rank_results(results, fields, None, "FR")),
+        ("keyed top-k", lambda: rank_results(keyed, fields, limit, "FR")),
+        ("keyed full", lambda: rank_results(keyed, fields, None, "FR")),
+    )
+    print(f"{count} results, limit {limit}, {runs} runs")
+    for name, func in cases:
+        elapsed = timeit(func, number=runs) / runs
+        print(f"{name:<22} {elapsed * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
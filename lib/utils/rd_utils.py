@@ -1,8 +1,11 @@
 import copy
 import time
 from datetime import datetime
+from threading import Lock, Thread
 from lib.api.jacktook.kodi import kodilog
-from lib.clients.debrid.realdebrid import RealDebrid
+from lib.clients.debrid.debrid_client import ProviderException
+from lib.clients.debrid.realdebrid import ActiveLimitError, RealDebrid
+from lib.db.debrid_db import debrid_db
 from lib.utils.kodi_utils import (
     get_setting,
     dialog_text,
@@ -23,8 +26,8 @@ def check_rd_cached(
     results, cached_results, uncached_results, telegram_results, total, dialog, lock
 ):
     client = RealDebrid(token=get_setting("real_debrid_token"))
-    torr_available = client.get_user_torrent_list()
-    torr_available_hashes = [torr["hash"] for torr in torr_available]
+    sync_rd_torrents(client)
+    torr_available_hashes = debrid_db.get_rd_hashes()
 
     for res in copy.deepcopy(results):
         if res["indexer"] == Indexer.TELEGRAM:
@@ -34,7 +37,7 @@ def check_rd_cached(
         debrid_dialog_update("RD", total, dialog, lock)
         res["type"] = Debrids.RD
 
-        if res["indexer"] == Indexer.MEDIAFUSION:
+        if Indexer.MEDIAFUSION in res.get("indexers", [res["indexer"]]):
             res["isCached"] = True
             cached_results.append(res)
         else:
@@ -49,22 +52,182 @@ def check_rd_cached(
     cached_results.extend(uncached_results)
 
 
+RD_MIRROR_FRESHNESS = 60
+RD_MIRROR_FULL_SYNC = 6 * 60 * 60
+RD_INCREMENTAL_PAGE_SIZE = 100
+RD_FULL_PAGE_SIZE = 2500
+
+_mirror_lock = Lock()
+
+
+def sync_rd_torrents(client, force=False):
+    """
+    Refresh the local mirror of the account torrents. The list is newest
+    first, so an incremental refresh stops at the first page holding an
+    already known torrent. Deleted torrents are only noticed by the full
+    resync, done every few hours.
+    """
+    with _mirror_lock:
+        now = time.time()
+        if not force and now - debrid_db.get_sync_time("rd_torrents") < RD_MIRROR_FRESHNESS:
+            return
+
+        full = force or now - debrid_db.get_sync_time("rd_torrents_full") > RD_MIRROR_FULL_SYNC
+        known = set() if full else debrid_db.get_rd_torrent_ids()
+        page_size = RD_FULL_PAGE_SIZE if full else RD_INCREMENTAL_PAGE_SIZE
+
+        torrents = []
+        page = 1
+        while True:
+            batch = client.get_user_torrent_list(page=page, limit=page_size)
+            new = [t for t in batch if str(t["id"]) not in known]
+            torrents.extend(new)
+            if len(batch) < page_size or len(new) < len(batch):
+                break
+            page += 1
+
+        debrid_db.set_rd_torrents(torrents, replace=full)
+        debrid_db.set_sync_time("rd_torrents", now)
+        if full:
+            debrid_db.set_sync_time("rd_torrents_full", now)
+        kodilog(f"RD torrents mirror: {len(torrents)} synced, full={full}")
+
+
+def get_rd_torrent(client, info_hash):
+    """Account torrent of info_hash with its files, from the mirror."""
+    sync_rd_torrents(client)
+    torrent = debrid_db.get_rd_torrent(info_hash)
+    if not torrent:
+        return
+    try:
+        torrent_info = client.get_torrent_info(torrent["id"])
+    except ProviderException:
+        torrent_info = {}
+    if not torrent_info.get("id"):
+        # Deleted on the account since the last full resync.
+        debrid_db.delete_rd_torrent(torrent["id"])
+        return
+    return torrent_info
+
+
+def delete_rd_torrent(client, torrent_id):
+    client.delete_torrent(torrent_id)
+    debrid_db.delete_rd_torrent(torrent_id)
+
+
+# Keep this many active slots free for the next adds.
+RD_SLOT_HEADROOM = 1
+RD_ACTIVE_STATUSES = (
+    "magnet_conversion",
+    "waiting_files_selection",
+    "queued",
+    "downloading",
+    "compressing",
+    "uploading",
+)
+
+
+class RDSlotManager:
+    """
+    Keeps free active download slots on the Real-Debrid account. The active
+    count is tracked locally, from the last activeCount answer plus the adds
+    made since, and slots are freed in a background thread before the limit
+    is reached, deleting the least recently played active torrents.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._thread = None
+
+    def reserve(self, client, info_hash):
+        """Called before adding info_hash, never waits on the API."""
+        nb, limit = debrid_db.get_rd_slots()
+        if not limit or nb + RD_SLOT_HEADROOM >= limit:
+            self._start(client, info_hash)
+
+    def added(self, torrent_info):
+        if torrent_info.get("status") in RD_ACTIVE_STATUSES:
+            nb, limit = debrid_db.get_rd_slots()
+            debrid_db.set_rd_slots(nb + 1, limit)
+
+    def free_now(self, client, info_hash):
+        """Free slots synchronously, when an add was refused for the limit."""
+        with self._lock:
+            thread = self._thread
+        if thread:
+            thread.join()
+        self._free_slots(client, info_hash, needed=1)
+
+    def _start(self, client, info_hash):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = Thread(
+                target=self._free_slots, args=(client, info_hash), daemon=True
+            )
+            self._thread.start()
+
+    def _free_slots(self, client, keep_hash, needed=RD_SLOT_HEADROOM + 1):
+        """Delete active torrents until needed slots are free, keep_hash aside."""
+        try:
+            active = client.get_torrent_active_count()
+            nb, limit = active["nb"], active["limit"]
+            excess = nb + needed - limit
+            if excess > 0:
+                victims = self._pick_victims(client, active.get("list", []), keep_hash)
+                deleted = 0
+                for torrent in victims[:excess]:
+                    try:
+                        delete_rd_torrent(client, torrent["id"])
+                        deleted += 1
+                    except ProviderException:
+                        pass
+                nb -= deleted
+                kodilog(f"RD slots: freed {deleted} of {excess}, {nb}/{limit} active")
+            debrid_db.set_rd_slots(nb, limit)
+        except Exception as e:
+            kodilog(f"RD slots: {e}")
+
+    @staticmethod
+    def _pick_victims(client, active_hashes, keep_hash):
+        hashes = [h.lower() for h in active_hashes if h.lower() != keep_hash.lower()]
+        victims = debrid_db.get_rd_eviction_order(hashes)
+        if len(victims) < len(hashes):
+            # Added outside the addon since the last sync.
+            sync_rd_torrents(client, force=True)
+            victims = debrid_db.get_rd_eviction_order(hashes)
+        return victims
+
+
+rd_slots = RDSlotManager()
+
+
 def add_rd_magnet(client, info_hash, is_pack=False):
     kodilog("rd_utils::add_rd_magnet")
-    torrent_info = client.get_available_torrent(info_hash)
+    torrent_info = get_rd_torrent(client, info_hash)
     if not torrent_info:
-        check_max_active_count(client)
+        rd_slots.reserve(client, info_hash)
         magnet = info_hash_to_magnet(info_hash)
-        response = client.add_magent_link(magnet)
+        try:
+            response = client.add_magent_link(magnet)
+        except ActiveLimitError:
+            rd_slots.free_now(client, info_hash)
+            try:
+                response = client.add_magent_link(magnet)
+            except ActiveLimitError as e:
+                e.notify()
+                raise
         torrent_id = response.get("id")
         if not torrent_id:
             kodilog("Failed to add magnet link to Real-Debrid")
             return
         torrent_info = client.get_torrent_info(torrent_id)
+        debrid_db.set_rd_torrents([torrent_info])
+        rd_slots.added(torrent_info)
     torrent_id = torrent_info["id"]
     status = torrent_info["status"]
     if status in ["magnet_error", "error", "virus", "dead"]:
-        client.delete_torrent(torrent_id)
+        delete_rd_torrent(client, torrent_id)
         raise Exception(f"Torrent cannot be downloaded due to status: {status}")
     elif status in ["queued", "downloading"]:
         return
@@ -101,7 +264,7 @@ def get_rd_link(info_hash):
 
 
 def get_rd_pack_info(info_hash):
-    info = get_cached(info_hash)
+    info = get_cached(info_hash, namespace="debrid")
     if info:
         return info
     client = RealDebrid(token=get_setting("real_debrid_token"))
@@ -120,7 +283,7 @@ def get_rd_pack_info(info_hash):
             title = item["path"].split("/", 1)[1]
             files.append((item["id"], title))
         info["files"] = files
-        set_cached(info, info_hash)
+        set_cached(info, info_hash, namespace="debrid")
         return info
     else:
         notification("Not a torrent pack")
@@ -154,16 +317,5 @@ def get_rd_info():
     dialog_text("Real-Debrid", "\n".join(body))
 
 
-def check_max_active_count(client):
-    active_count = client.get_torrent_active_count()
-    if active_count["nb"] >= active_count["limit"]:
-        hashes = active_count["list"]
-        if hashes:
-            torrents = client.get_user_torrent_list()
-            torrent_info = [i for i in torrents if i["hash"] == hashes[0]]
-            torrent_id = torrent_info[0]["id"]
-            client.delete_torrent(torrent_id)  # delete one to open a slot
-
-
 class LinkNotFoundError(Exception):
     pass
@@ -0,0 +1,190 @@
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+
+# Large enough for every title of a search with all indexers enabled.
+PARSE_CACHE_SIZE = 16384
+
+Release = namedtuple(
+    "Release",
+    [
+        "seasons",
+        "episodes",
+        "is_pack",
+        "resolution",
+        "source",
+        "codec",
+        "hdr",
+        "audio",
+    ],
+)
+
+# Titles are matched once lowercased and accent free, with dots, underscores
+# and brackets turned into spaces, so "The.Show.S01E02" reads "the show s01e02".
+_SEPARATORS = re.compile(r"[._\[\]()]+")
+
+# S01E02, S01E02E03, S01E02-E05, S01E02-05
+_SEASON_EPISODE = re.compile(
+    r"\bs(\d{1,2}) ?e(\d{1,4})((?:(?: ?- ?e?| ?e)\d{1,4})*)\b"
+)
+# 1x02, 01x02-03
+_CROSS_EPISODE = re.compile(r"\b(\d{1,2})x(\d{1,3})(?:-(\d{1,3}))?\b")
+# S01-S03, S01-03, S01 S02
+_SEASON_RANGE = re.compile(r"\bs(\d{1,2})(?: ?- ?s?(\d{1,2}))?\b")
+# Season 1, Seasons 1-3, Saison 2, Temporada 3
+_SEASON_WORD = re.compile(
+    r"\b(?:seasons?|saisons?|temporadas?|stagioni|stagione)"
+    r" ?(\d{1,2})(?: ?(?:-|to|a|à) ?(\d{1,2}))?\b"
+)
+# Episode 5, Ep 5, Épisode 05
+_EPISODE_WORD = re.compile(r"\b(?:episode|episodio|ep) ?(\d{1,4})\b")
+# Absolute anime numbering, "Show - 05 [1080p]"
+_ABSOLUTE_EPISODE = re.compile(r" - (?!(?:19|20)\d\d\b)(\d{1,4})(?: |$)")
+_PACK = re.compile(
+    r"\b(?:complete|complet|completa|integral|integrale|the complete"
+    r"|total season|collection|batch|all seasons|saison|season)\b"
+)
+
+_RESOLUTIONS = (
+    ("4k", re.compile(r"\b(?:2160p|4k|uhd)\b")),
+    ("1080p", re.compile(r"\b1080[pi]\b")),
+    ("720p", re.compile(r"\b720p\b")),
+    ("480p", re.compile(r"\b(?:480p|576p|sd)\b")),
+)
+_SOURCES = (
+    ("REMUX", re.compile(r"\bremux\b")),
+    ("BluRay", re.compile(r"\b(?:blu ?-?ray|bdrip|brrip|bd25|bd50)\b")),
+    ("WEB-DL", re.compile(r"\bweb ?-?dl\b")),
+    ("WEBRip", re.compile(r"\bweb ?-?rip\b")),
+    ("WEB", re.compile(r"\bweb\b")),
+    ("HDTV", re.compile(r"\bhdtv\b")),
+    ("DVDRip", re.compile(r"\b(?:dvdrip|dvd)\b")),
+    ("CAM", re.compile(r"\b(?:cam|hdcam|camrip)\b")),
+    ("TELESYNC", re.compile(r"\b(?:ts|telesync|hdts|tele|sync)\b")),
+    ("TELECINE", re.compile(r"\b(?:tc|telecine)\b")),
+    ("SCR", re.compile(r"\b(?:scr|screener|dvdscr)\b")),
+)
+_CODECS = (
+    ("HEVC", re.compile(r"\b(?:x265|h ?265|hevc)\b")),
+    ("AVC", re.compile(r"\b(?:x264|h ?264|avc)\b")),
+    ("AV1", re.compile(r"\bav1\b")),
+    ("XviD", re.compile(r"\bxvid\b")),
+)
+_HDR = (
+    ("DV", re.compile(r"\b(?:dv|dovi|dolby ?vision)\b")),
+    ("HDR10+", re.compile(r"\bhdr10(?:\+|plus)")),
+    ("HDR", re.compile(r"\bhdr(?:10)?\b")),
+)
+_AUDIO = (
+    ("Atmos", re.compile(r"\batmos\b")),
+    ("TrueHD", re.compile(r"\btruehd\b")),
+    ("DTS-HD", re.compile(r"\bdts ?-?(?:hd|ma|x)\b")),
+    ("DTS", re.compile(r"\bdts\b")),
+    ("DD+", re.compile(r"\b(?:ddp|dd\+|eac3|e ?-?ac ?-?3)")),
+    ("DD", re.compile(r"\b(?:dd|ac3|dd5 1)\b")),
+    ("AAC", re.compile(r"\baac\b")),
+)
+
+RESOLUTION_RANK = {"4k": 0, "1080p": 1, "720p": 2, "480p": 3, None: 4}
+
+
+def _clean(title):
+    title = unicodedata.normalize("NFKD", str(title).lower())
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    return " ".join(_SEPARATORS.sub(" ", title).split())
+
+
+def _span(first, last=None):
+    first = int(first)
+    last = int(last) if last else first
+    if last < first or last - first > 500:
+        return (first,)
+    return tuple(range(first, last + 1))
+
+
+def _first(patterns, title):
+    for name, pattern in patterns:
+        if pattern.search(title):
+            return name
+    return None
+
+
+def _all(patterns, title):
+    return tuple(name for name, pattern in patterns if pattern.search(title))
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_release(title):
+    """
+    Parse a release title into a Release record. Seasons and episodes are
+    sorted tuples, empty when the title does not say, so multi-episode and
+    multi-season packs ("S01E01-E03", "S01-S03") cover every number in range.
+    """
+    clean = _clean(title)
+    seasons = set()
+    episodes = set()
+
+    for match in _SEASON_EPISODE.finditer(clean):
+        seasons.add(int(match.group(1)))
+        numbers = [int(match.group(2))]
+        numbers += [int(n) for n in re.findall(r"\d+", match.group(3))]
+        if "-" in match.group(3):
+            episodes.update(_span(numbers[0], numbers[-1]))
+        else:
+            episodes.update(numbers)
+
+    for match in _CROSS_EPISODE.finditer(clean):
+        seasons.add(int(match.group(1)))
+        episodes.update(_span(match.group(2), match.group(3)))
+
+    if not episodes:
+        for match in _SEASON_RANGE.finditer(clean):
+            seasons.update(_span(match.group(1), match.group(2)))
+
+    for match in _SEASON_WORD.finditer(clean):
+        seasons.update(_span(match.group(1), match.group(2)))
+
+    if not episodes:
+        for match in _EPISODE_WORD.finditer(clean):
+            episodes.add(int(match.group(1)))
+    if not episodes and not seasons:
+        for match in _ABSOLUTE_EPISODE.finditer(clean):
+            episodes.add(int(match.group(1)))
+
+    is_pack = (
+        len(episodes) > 1
+        or (bool(seasons) and not episodes)
+        or (not episodes and bool(_PACK.search(clean)))
+    )
+
+    return Release(
+        seasons=tuple(sorted(seasons)),
+        episodes=tuple(sorted(episodes)),
+        is_pack=is_pack,
+        resolution=_first(_RESOLUTIONS, clean),
+        source=_first(_SOURCES, clean),
+        codec=_first(_CODECS, clean),
+        hdr=_all(_HDR, clean),
+        audio=_all(_AUDIO, clean),
+    )
+
+
+def matches_episode(release, season, episode):
+    """True if the release holds the given episode, alone or inside a pack."""
+    season = int(season)
+    episode = int(episode)
+    if release.seasons and season not in release.seasons:
+        return False
+    if release.episodes:
+        return episode in release.episodes
+    return release.is_pack
+
+
+def contains_name(title, name):
+    """Case and accent insensitive, literal match of an episode name."""
+    if not name:
+        return False
+    name = _clean(name)
+    return bool(name) and name in _clean(title)
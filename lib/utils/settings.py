@@ -1,3 +1,4 @@
+from datetime import timedelta
 from .kodi_utils import get_setting, get_property, ADDON_ID
 import xbmc
 
@@ -34,6 +35,25 @@ def get_cache_expiration():
     return get_int_setting("cache_expiration")
 
 
+def get_cache_budget():
+    """Size budget of the cache database, in bytes."""
+    return get_int_setting("cache_size_budget") * 1024 * 1024
+
+
+def get_negative_expiration():
+    return timedelta(minutes=get_int_setting("cache_negative_expiration"))
+
+
+def get_stale_expiration():
+    if not get_setting("cache_stale_enabled"):
+        return timedelta(0)
+    return timedelta(hours=get_int_setting("cache_stale_expiration"))
+
+
+def get_debrid_availability_expiration():
+    return timedelta(hours=get_int_setting("debrid_availability_expiration"))
+
+
 def get_jackett_timeout():
     return get_int_setting("jackett_timeout")
 
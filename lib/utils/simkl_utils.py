@@ -29,14 +29,14 @@ def search_simkl_episodes(title, anilist_id, mal_id, plugin):
 
 
 def search_simkl_api(mal_id):
-    cached_results = get_cached(type, params=(mal_id))
+    cached_results = get_cached(type, params=(mal_id), namespace="metadata")
     if cached_results:
         return cached_results
 
     simkl = SIMKL()
     res = simkl.get_anilist_episodes(mal_id)
 
-    set_cached(res, type, params=(mal_id))
+    set_cached(res, type, params=(mal_id), namespace="metadata")
     return res
 
 
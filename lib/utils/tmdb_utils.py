@@ -38,7 +38,7 @@ def add_icon_tmdb(item, icon_path="tmdb.png"):
 
 def tmdb_get(path, params=None):
     identifier = "{}|{}".format(path, params)
-    data = cache.get(identifier, hashed_key=True)
+    data = cache.get(identifier, hashed_key=True, namespace="metadata")
     if data:
         return data
     if path == "search_tv":
@@ -76,6 +76,7 @@ def tmdb_get(path, params=None):
         data,
         timedelta(hours=get_cache_expiration() if is_cache_enabled() else 0),
         hashed_key=True,
+        namespace="metadata",
     )
     return data
 
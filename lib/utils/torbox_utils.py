@@ -1,11 +1,14 @@
 import copy
 from lib.clients.debrid.torbox import Torbox
+from lib.db.debrid_db import debrid_db
 from lib.api.jacktook.kodi import kodilog
 from lib.utils.kodi_utils import get_setting, notification
+from lib.utils.settings import get_debrid_availability_expiration
 from lib.utils.utils import (
     Debrids,
     Indexer,
     debrid_dialog_update,
+    fetch_in_chunks,
     get_cached,
     get_public_ip,
     info_hash_to_magnet,
@@ -21,9 +24,13 @@ client = Torbox(token=get_setting("torbox_token"))
 def check_torbox_cached(
     results, cached_results, uncached_results, telegram_results, total, dialog, lock
 ):
-    hashes = [res.get("infoHash") for res in results]
-    response = client.get_torrent_instant_availability(hashes)
-    cached_response = response.get("data", [])
+    failed = []
+    availability = debrid_db.lookup(
+        Debrids.TB,
+        [res.get("infoHash") for res in results],
+        lambda hashes: fetch_torbox_availability(hashes, failed),
+        get_debrid_availability_expiration(),
+    )
 
     for res in copy.deepcopy(results):
         if res["indexer"] == Indexer.TELEGRAM:
@@ -38,7 +45,7 @@ def check_torbox_cached(
 
         if info_hash:
             res["type"] = Debrids.TB
-            if info_hash in cached_response:
+            if availability.get(info_hash):
                 with lock:
                     res["isCached"] = True
                     cached_results.append(res)
@@ -47,6 +54,34 @@ def check_torbox_cached(
                     res["isCached"] = False
                     uncached_results.append(res)
 
+    # The sources are kept, but the check must not count as answered or its
+    # partial result would be cached as complete.
+    if failed:
+        raise TorboxException(
+            f"Torbox availability of {len(failed)} hashes is unknown"
+        )
+
+
+# Hashes per checkcached request and requests in flight, kept under the
+# Torbox API rate limit and the length limit of the query string.
+TB_AVAILABILITY_CHUNK = 100
+TB_AVAILABILITY_WORKERS = 3
+
+
+def fetch_torbox_availability(hashes, failed):
+    """Availability of hashes, the ones that could not be checked go to failed."""
+    availability, unchecked = fetch_in_chunks(
+        _fetch_torbox_chunk, hashes, TB_AVAILABILITY_CHUNK, TB_AVAILABILITY_WORKERS
+    )
+    failed.extend(unchecked)
+    return availability
+
+
+def _fetch_torbox_chunk(hashes):
+    response = client.get_torrent_instant_availability(hashes)
+    cached_hashes = {h.lower() for h in response.get("data") or {}}
+    return {info_hash: info_hash in cached_hashes for info_hash in hashes}
+
 
 def add_torbox_torrent(info_hash):
     kodilog("torbox_utils::add_torbox_torrent")
@@ -86,7 +121,7 @@ def get_torbox_pack_link(file_id, torrent_id):
 
 
 def get_torbox_pack_info(info_hash):
-    info = get_cached(info_hash)
+    info = get_cached(info_hash, namespace="debrid")
     if info:
         return info
     torrent_info = add_torbox_torrent(info_hash)
@@ -106,7 +141,7 @@ def get_torbox_pack_info(info_hash):
             for id, name in enumerate(files_names):
                 files.append((id, name))
             info["files"] = files
-            set_cached(info, info_hash)
+            set_cached(info, info_hash, namespace="debrid")
             return info
         else:
             notification("Not a torrent pack")
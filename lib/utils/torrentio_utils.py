@@ -29,7 +29,7 @@ items = [
 
 
 def open_providers_selection(identifier="torrentio_providers"):
-    cached_providers = cache.get(identifier, hashed_key=True)
+    cached_providers = cache.get(identifier, hashed_key=True, namespace="settings")
     if cached_providers:
         choice = xbmcgui.Dialog().yesno(
             "Providers Selection Dialog",
@@ -53,6 +53,7 @@ def providers_selection(identifier="torrentio_providers"):
             providers,
             timedelta(hours=get_cache_expiration() if is_cache_enabled() else 0),
             hashed_key=True,
+            namespace="settings",
         )
         xbmcgui.Dialog().ok(
             "Selection Dialog", f"Successfully selected: {',' .join(providers)}"
@@ -64,14 +65,15 @@ def providers_selection(identifier="torrentio_providers"):
 
 
 def filter_torrentio_provider(results, identifier="torrentio_providers"):
-    selected_providers = cache.get(identifier, hashed_key=True)
+    selected_providers = cache.get(identifier, hashed_key=True, namespace="settings")
     if not selected_providers:
         return results
 
+    # Merged duplicates are kept if another indexer also returned them.
     filtered_results = [
         res
         for res in results
-        if res["indexer"] != "Torrentio"
-        or (res["indexer"] == "Torrentio" and res["provider"] in selected_providers)
+        if res.get("indexers", [res["indexer"]]) != ["Torrentio"]
+        or res["provider"] in selected_providers
     ]
     return filtered_results
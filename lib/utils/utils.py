@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import hashlib
 import os
 import re
+from threading import Lock
 import unicodedata
 import requests
 
@@ -12,11 +13,16 @@ from lib.api.jacktook.kodi import kodilog
 from lib.api.trakt.trakt_api import clear_cache
 from lib.db.bookmark_db import bookmark_db
 from lib.api.tvdbapi.tvdbapi import TVDBAPI
-from lib.db.cached import cache
+from lib.db.cached import DEFAULT_NAMESPACE, cache
 from lib.db.main_db import main_db
 
 
 from lib.torf._magnet import Magnet
+from lib.utils.dedup import (
+    get_dedup_key,
+    normalize_title,
+    remove_duplicate,
+)
 from lib.utils.kodi_utils import (
     ADDON_HANDLE,
     ADDON_PATH,
@@ -29,8 +35,24 @@ from lib.utils.kodi_utils import (
     translation,
 )
 
-from lib.utils.settings import get_cache_expiration, is_cache_enabled
-
+from lib.utils.settings import (
+    get_cache_expiration,
+    get_negative_expiration,
+    get_stale_expiration,
+    is_cache_enabled,
+)
+from lib.utils.ranking import (
+    DEFAULT_RANK_ORDER,
+    parse_rank_order,
+    rank_results,
+    set_rank_keys,
+    set_rank_values,
+)
+from lib.utils.release_parser import (
+    contains_name,
+    matches_episode,
+    parse_release,
+)
 from lib.utils.torrentio_utils import filter_torrentio_provider
 from xbmcgui import ListItem, Dialog
 from xbmcgui import DialogProgressBG
@@ -54,6 +76,10 @@ MEDIA_FUSION_DEFAULT_KEY = "eJwBYACf_4hAkZJe85krAoD5hN50-2M0YuyGmgswr-cis3uap4FN
 
 dialog_update = {"count": -1, "percent": 50}
 
+# Stale entries served during this plugin call, refreshed once it is done.
+_revalidations = {}
+_revalidations_lock = Lock()
+
 video_extensions = (
     ".001",
     ".3g2",
@@ -189,6 +215,19 @@ torrent_indexers = [
 ]
 
 
+class NullDialog:
+    """Progress dialog stand-in for work running in the background."""
+
+    def create(self, *args, **kwargs):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+
 class DialogListener:
     def __init__(self):
         self._dialog = DialogProgressBG()
@@ -432,7 +471,7 @@ def is_torrent_watched(title):
 
 def get_fanart_details(tvdb_id="", tmdb_id="", mode="tv"):
     identifier = "{}|{}".format("fanart.tv", tvdb_id)
-    data = cache.get(identifier, hashed_key=True)
+    data = cache.get(identifier, hashed_key=True, namespace="fanart")
     if data:
         return data
     else:
@@ -449,6 +488,7 @@ def get_fanart_details(tvdb_id="", tmdb_id="", mode="tv"):
                 data,
                 timedelta(hours=get_cache_expiration() if is_cache_enabled() else 0),
                 hashed_key=True,
+                namespace="fanart",
             )
     return data
 
@@ -473,24 +513,104 @@ def get_fanart_data(fanart_details):
     return {"fanart": fanart, "clearlogo": clearlogo, "poster": poster}
 
 
-def get_cached(path, params={}):
+def get_cached(path, params={}, namespace=DEFAULT_NAMESPACE):
     identifier = "{}|{}".format(path, params)
-    return cache.get(identifier, hashed_key=True)
+    return cache.get(identifier, hashed_key=True, namespace=namespace)
 
 
-def set_cached(data, path, params={}):
+def set_cached(data, path, params={}, namespace=DEFAULT_NAMESPACE):
     identifier = "{}|{}".format(path, params)
     cache.set(
         identifier,
         data,
         timedelta(hours=get_cache_expiration() if is_cache_enabled() else 0),
         hashed_key=True,
+        namespace=namespace,
     )
 
 
+def get_swr_cached(path, params={}, namespace=DEFAULT_NAMESPACE):
+    """
+    Stale-while-revalidate read, returns (data, is_stale). Expired entries
+    are kept for the stale window so they can be served while refreshed.
+    """
+    identifier = "{}|{}".format(path, params)
+    entry = cache.get(identifier, hashed_key=True, namespace=namespace)
+    if not entry:
+        return None, False
+    if not isinstance(entry, dict) or "fresh_until" not in entry:
+        return entry, False  # written by set_cached
+    return copy_rows(entry["data"]), entry["fresh_until"] <= datetime.utcnow()
+
+
+def set_swr_cached(data, path, params={}, namespace=DEFAULT_NAMESPACE):
+    identifier = "{}|{}".format(path, params)
+    expiration = timedelta(hours=get_cache_expiration() if is_cache_enabled() else 0)
+    if not expiration:
+        return
+    cache.set(
+        identifier,
+        {"data": copy_rows(data), "fresh_until": datetime.utcnow() + expiration},
+        expiration + get_stale_expiration(),
+        hashed_key=True,
+        namespace=namespace,
+    )
+
+
+# Negative keys start with the path too, so a prefix invalidation of a
+# search drops its empty answers along with its results.
+def get_negative_cached(path, params={}, namespace=DEFAULT_NAMESPACE):
+    identifier = "{}|negative|{}".format(path, params)
+    return cache.get(identifier, hashed_key=True, namespace=namespace)
+
+
+def set_negative_cached(data, path, params={}, namespace=DEFAULT_NAMESPACE):
+    """Remember an empty answer, apart from positive results and for less time."""
+    expiration = get_negative_expiration()
+    if not is_cache_enabled() or not expiration:
+        return
+    identifier = "{}|negative|{}".format(path, params)
+    cache.set(identifier, data, expiration, hashed_key=True, namespace=namespace)
+
+
+def copy_rows(data):
+    """
+    Copy of a list of results, down to the result dicts. The cache memory
+    tier hands out the stored objects, and results are labeled in place by
+    pre_process and the debrid checks.
+    """
+    if type(data) is not list:
+        return data
+    return [dict(row) if type(row) is dict else row for row in data]
+
+
+def revalidate_later(key, func, *args):
+    """Queue func(*args) for run_revalidations, once per key."""
+    with _revalidations_lock:
+        _revalidations.setdefault(key, (func, args))
+
+
+def run_revalidations():
+    """
+    Refresh the stale entries served during this plugin call. Called by the
+    router once the action is done, in the foreground: the plugin process
+    exits when the script returns, without waiting for daemon threads.
+    """
+    while True:
+        with _revalidations_lock:
+            if not _revalidations:
+                return
+            key = next(iter(_revalidations))
+            func, args = _revalidations.pop(key)
+        try:
+            func(*args)
+        except Exception as e:
+            kodilog(f"Refresh of {key} failed: {e}")
+
+
 def db_get(name, func, path, params):
     identifier = "{}|{}".format(path, params)
-    data = cache.get(identifier, hashed_key=True)
+    data = cache.get(identifier, hashed_key=True, namespace="search")
     if not data:
         if name == "search_client":
             data = func()
@@ -499,13 +619,14 @@ def db_get(name, func, path, params):
             data,
             timedelta(hours=get_cache_expiration() if is_cache_enabled() else 0),
             hashed_key=True,
+            namespace="search",
         )
     return data
 
 
 def tvdb_get(path, params={}):
     identifier = "{}|{}".format(path, params)
-    data = cache.get(identifier, hashed_key=True)
+    data = cache.get(identifier, hashed_key=True, namespace="metadata")
     if data:
         return data
     if path == "get_imdb_id":
@@ -515,6 +636,7 @@ def tvdb_get(path, params={}):
         data,
         timedelta(hours=get_cache_expiration() if is_cache_enabled() else 0),
         hashed_key=True,
+        namespace="metadata",
     )
     return data
 
@@ -567,6 +689,29 @@ def execute_thread_pool(results, func, *args, **kwargs):
         executor.shutdown(wait=True)
 
 
+def fetch_in_chunks(fetch, items, chunk_size, max_workers):
+    """
+    Call fetch on chunks of items, at most max_workers at a time, and merge
+    the dicts it returns. Returns the merged dict and the items of the chunks
+    that failed, which are logged and left out of the dict.
+    """
+    chunks = list(paginate_list(items, chunk_size))
+    merged = {}
+    failed = []
+    if not chunks:
+        return merged, failed
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        futures = [(chunk, executor.submit(fetch, chunk)) for chunk in chunks]
+        for chunk, future in futures:
+            try:
+                merged.update(future.result())
+            except Exception as e:
+                kodilog(f"Chunked request failed: {e}")
+                failed.extend(chunk)
+    return merged, failed
+
+
 def paginate_list(data, page_size=10):
     for i in range(0, len(data), page_size):
         yield data[i : i + page_size]
@@ -602,25 +747,10 @@ def clear(type="", update=False):
         container_refresh()
 
 
-def limit_results(results):
-    limit = int(get_setting("indexers_total_results"))
-    return results[:limit]
-
-
 def get_description_length():
     return int(get_setting("indexers_desc_length"))
 
 
-def remove_duplicate(results):
-    seen_values = []
-    result_dict = []
-    for res in results:
-        if res not in seen_values:
-            result_dict.append(res)
-            seen_values.append(res)
-    return result_dict
-
-
 def unzip(zip_location, destination_location, destination_check):
     try:
         zipfile = ZipFile(zip_location)
@@ -635,51 +765,8 @@ def unzip(zip_location, destination_location, destination_check):
 
 
 def check_pack(results, season_num):
-    season_fill = f"{int(season_num):02}"
-    pattern1 = r"S%s" % (season_num)
-    pattern2 = r"S%s" % (season_fill)
-    pattern3 = r"\sS%s\s" % (season_num)
-    pattern4 = r"\.%s\.season" % (season_num)
-    pattern5 = r"total\.season"
-    pattern6 = r"season"
-    pattern7 = r"the\.complete"
-    pattern8 = r"complete"
-    pattern9 = r"\.season\.%s\." % season_num
-    pattern10 = r"\.season%s\." % season_num
-    pattern11 = r"\.season\.%s\." % season_fill
-    pattern12 = r"\sS%s\s" % (season_fill)
-    pattern13 = r"complet"
-    pattern14 = r"intégral"
-    pattern15 = r"integral"
-    pattern16 = r"saison"
-
-    patterns = "|".join(
-        [
-            pattern1,
-            pattern2,
-            pattern3,
-            pattern4,
-            pattern5,
-            pattern6,
-            pattern7,
-            pattern8,
-            pattern9,
-            pattern10,
-            pattern11,
-            pattern12,
-            pattern13,
-            pattern14,
-            pattern15,
-            pattern16,
-        ]
-    )
-
     for res in results:
-        match = re.search(f"{patterns}", res["title"].lower())
-        if match:
-            res["isPack"] = True
-        else:
-            res["isPack"] = False
+        res["isPack"] = parse_release(res["title"]).is_pack
 
 
 def pre_process(results, mode, episode_name, episode, season):
@@ -698,131 +785,105 @@ def pre_process(results, mode, episode_name, episode, season):
 def post_process(results, season=None):
     if season:
         check_pack(results, season)
+    return rank_sources(results)
 
-    if (
-        get_setting("torrentio_enabled")
-        and get_setting("torrentio_priority_lang") != "None"
-    ):
-        results = sort_priority_language(results)
-    else:
-        results = sort_results(results)
-
-    results = limit_results(results)
-
-    return results
-
-
-def sort_priority_language(results):
-    torrentio_priority_lang = get_setting("torrentio_priority_lang")
-    priority_lang_list = []
-    non_priority_lang_list = []
-    for res in results:
-        if "languages" in res and torrentio_priority_lang in res["languages"]:
-            priority_lang_list.append(res)
-        else:
-            non_priority_lang_list.append(res)
-    priority_lang_list.extend(non_priority_lang_list)
-    return sort_results(priority_lang_list)
 
+def rank_sources(results):
+    """Rank results by the sort settings, keeping the first total results."""
+    priority_lang = None
+    if get_setting("torrentio_enabled"):
+        priority_lang = get_setting("torrentio_priority_lang")
+        if priority_lang == "None":
+            priority_lang = None
 
-def sort_results(res):
     sort_by = get_setting("indexers_sort_by")
-    if sort_by == "Seeds":
-        return sorted(res, key=lambda r: r.get("seeders", 0), reverse=True)
-    elif sort_by == "Size":
-        return sorted(res, key=lambda r: r.get("size", 0), reverse=True)
-    elif sort_by == "Date":
-        return sorted(res, key=lambda r: r.get("publishDate", ""), reverse=True)
-    elif sort_by == "Quality":
-        return sorted(res, key=lambda r: r.get("quality", ""), reverse=True)
-    elif sort_by == "Cached":
-        return sorted(res, key=lambda r: r.get("isCached", ""), reverse=True)
+    if sort_by == "None":
+        fields = []
     else:
-        return res
+        fields = parse_rank_order(
+            get_setting("indexers_rank_order", DEFAULT_RANK_ORDER),
+            sort_by,
+            priority_lang,
+        )
+        # Keyed once, a streamed search ranks the growing list after every
+        # batch.
+        set_rank_keys(results, fields, priority_lang)
+
+    return rank_results(
+        results,
+        fields,
+        int(get_setting("indexers_total_results")),
+        priority_lang,
+    )
 
 
 def filter_by_episode(results, episode_name, episode_num, season_num):
-    episode_fill = f"{int(episode_num):02}"
-    season_fill = f"{int(season_num):02}"
-    pattern1 = r"S%sE%s" % (season_fill, episode_fill)
-    pattern2 = r"%sx%s" % (season_fill, episode_fill)
-    pattern3 = r"\s%s\s" % (season_fill)
-    pattern4 = r"S%s" % (season_fill)
-    pattern5 = r"S%sE%s" % (season_fill, episode_fill)
-    pattern6 = r"\sS%sE%s\s" % (season_fill, episode_fill)
-    pattern7 = "integral"
-    pattern8 = "intégral"
-    pattern9 = "complet"
-    pattern10 = r"season %s" % (season_num)
-    pattern11 = r"season %s" % (season_fill)
-    pattern12 = r"saison %s" % (season_num)
-    pattern13 = r"saison %s" % (season_fill)
-    pattern14 = r"- %s" % (episode_fill)
-
-    patterns = "|".join(
-        [
-            pattern1,
-            pattern2,
-            pattern3,
-            pattern4,
-            pattern5,
-            pattern6,
-            pattern7,
-            pattern8,
-            pattern9,
-            pattern10,
-            pattern11,
-            pattern12,
-            pattern13,
-            pattern14,
-            episode_name,
-        ]
-    )
-
     filtered_episodes = []
     for res in results:
-        match = re.search(f"{patterns}", res["title"], re.IGNORECASE)
-        if match:
+        release = parse_release(res["title"])
+        if matches_episode(release, season_num, episode_num) or contains_name(
+            res["title"], episode_name
+        ):
             filtered_episodes.append(res)
     return filtered_episodes
 
 
-def filter_by_quality(results):
-    quality_720p = []
-    quality_1080p = []
-    quality_4k = []
-    no_quarlity = []
+QUALITY_LABELS = {
+    "4k": "[B][COLOR yellow]4k[/COLOR][/B]",
+    "1080p": "[B][COLOR blue]1080p[/COLOR][/B]",
+    "720p": "[B][COLOR orange]720p[/COLOR][/B]",
+    "480p": "[B][COLOR orange]480p[/COLOR][/B]",
+    None: "[B][COLOR yellow]N/A[/COLOR][/B]",
+}
+
 
+def filter_by_quality(results):
+    # Only labels the results, they are ordered by post_process.
     for res in results:
-        title = res["title"]
-        if "480p" in title:
-            res["quality"] = "[B][COLOR orange]480p[/COLOR][/B]"
-            quality_720p.append(res)
-        elif "720p" in title:
-            res["quality"] = "[B][COLOR orange]720p[/COLOR][/B]"
-            quality_720p.append(res)
-        elif "1080p" in title:
-            res["quality"] = "[B][COLOR blue]1080p[/COLOR][/B]"
-            quality_1080p.append(res)
-        elif "2160" in title:
-            res["quality"] = "[B][COLOR yellow]4k[/COLOR][/B]"
-            quality_4k.append(res)
-        else:
-            res["quality"] = "[B][COLOR yellow]N/A[/COLOR][/B]"
-            no_quarlity.append(res)
+        release = parse_release(res["title"])
+        res["quality"] = QUALITY_LABELS[release.resolution]
+        set_rank_values(res, release)
+    return results
+
+
+AUTO_PLAY_QUALITIES = {"720p": ("720p", "1080p", "4k"), "1080p": ("1080p", "4k"), "4k": ("4k",)}
+
+
+def is_auto_play_candidate(res, min_quality, min_seeders):
+    if res.get("isPack") or not res.get("isCached"):
+        return False
+    if (res.get("seeders") or 0) < min_seeders:
+        return False
+    resolution = parse_release(res["title"]).resolution
+    return resolution in AUTO_PLAY_QUALITIES[min_quality]
+
+
+def get_auto_play_candidates(results):
+    min_quality = get_setting("auto_play_min_quality", "1080p")
+    min_seeders = int(get_setting("auto_play_min_seeders", 0))
+    return [
+        res for res in results if is_auto_play_candidate(res, min_quality, min_seeders)
+    ]
 
-    combined_list = quality_4k + quality_1080p + quality_720p + no_quarlity
-    return combined_list
+
+def has_enough_auto_play_sources(results):
+    """Short-circuit policy for auto-play, True once the results are good enough."""
+    min_cached = int(get_setting("auto_play_min_cached", 1))
+    return len(get_auto_play_candidates(results)) >= min_cached
+
+
+AUTO_PLAY_UNDESIRED_SOURCES = ("CAM", "TELESYNC", "TELECINE", "SCR")
 
 
 def clean_auto_play_undesired(results):
-    undesired = ("SD", "CAM", "TELE", "SYNC", "480p")
     for res in copy.deepcopy(results):
-        if res.get("isPack"):
+        release = parse_release(res["title"])
+        if (
+            res.get("isPack")
+            or release.resolution == "480p"
+            or release.source in AUTO_PLAY_UNDESIRED_SOURCES
+        ):
             results.remove(res)
-        else:
-            if any(u in res["title"] for u in undesired):
-                results.remove(res)
     return results[0]
 
 
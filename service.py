@@ -10,13 +10,22 @@ from lib.utils.kodi_utils import (
 )
 from time import time
 from lib.api.jacktook.kodi import kodilog
-from lib.utils.settings import update_action, update_delay
+from lib.db.cached import cache
+from lib.db.debrid_db import debrid_db
+from lib.utils.settings import get_cache_budget, update_action, update_delay
 from lib.updater import updates_check_addon
 
 
 first_run_update_prop = "jacktook.first_run_update"
 pause_services_prop = "jacktook.pause_services"
 
+# Cache maintenance runs at most this often, once Kodi has been idle for
+# MAINTENANCE_IDLE seconds or the screensaver is on, never during playback.
+MAINTENANCE_INTERVAL = 30 * 60
+MAINTENANCE_DELAY = 2 * 60
+MAINTENANCE_IDLE = 5 * 60
+MAINTENANCE_POLL = 30
+
 
 class OnNotificationActions:
     def run(self, sender, method, data):
@@ -69,6 +78,40 @@ class UpdateCheck:
         kodilog("Update Check Service Finished")
 
 
+class CacheMaintenance:
+    def run(self):
+        kodilog("Cache Maintenance Service Started")
+        next_run = time() + MAINTENANCE_DELAY
+        monitor, player = xbmc.Monitor(), xbmc.Player()
+        while not monitor.waitForAbort(MAINTENANCE_POLL):
+            if time() < next_run or player.isPlayingVideo():
+                continue
+            idle = (
+                get_property(pause_services_prop) == "true"
+                or xbmc.getGlobalIdleTime() >= MAINTENANCE_IDLE
+            )
+            if not idle:
+                continue
+            try:
+                cache.maintain(get_cache_budget())
+            except Exception as e:
+                kodilog(f"Cache maintenance failed: {e}")
+            try:
+                debrid_db.maintain()
+            except Exception as e:
+                kodilog(f"Debrid database maintenance failed: {e}")
+            next_run = time() + MAINTENANCE_INTERVAL
+        try:
+            del monitor
+        except:
+            pass
+        try:
+            del player
+        except:
+            pass
+        kodilog("Cache Maintenance Service Finished")
+
+
 class JacktookMOnitor(xbmc.Monitor):
     def __init__(self):
         xbmc.Monitor.__init__(self)
@@ -78,6 +121,7 @@ class JacktookMOnitor(xbmc.Monitor):
         CheckKodiVersion().run()
         DatabaseSetup().run()
         Thread(target=UpdateCheck().run).start()
+        Thread(target=CacheMaintenance().run).start()
 
     def onNotification(self, sender, method, data):
         OnNotificationActions().run(sender, method, data)
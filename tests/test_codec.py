@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from lib.db import codec
+
+
+def make_rows(count):
+    return [
+        {
+            "title": "Show.S01E{:02}.1080p.WEB-DL-GRP".format(i),
+            "infoHash": "{:040x}".format(i),
+            "seeders": i * 3,
+            "size": 10**9 + i,
+            "isCached": i % 2 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def blob_format(blob):
+    return blob[len(codec.MAGIC) + 1] & ~codec.COMPRESSED
+
+
+def test_swr_entry_uses_row_format():
+    # The payload set_swr_cached stores for search and debrid results.
+    entry = {
+        "data": make_rows(200),
+        "fresh_until": datetime.utcnow() + timedelta(hours=6),
+    }
+    blob = codec.encode(entry)
+    assert blob_format(blob) == codec.SWR_ROWS
+    assert codec.decode(blob) == entry
+
+
+def test_rows_missing_keys_round_trip():
+    rows = make_rows(10)
+    del rows[3]["seeders"]
+    blob = codec.encode(rows)
+    assert blob_format(blob) == codec.ROWS
+    assert codec.decode(blob) == rows
+
+
+def test_other_values_are_pickled():
+    value = {"data": [1, 2, 3], "fresh_until": None}
+    blob = codec.encode(value)
+    assert blob_format(blob) == codec.PICKLE
+    assert codec.decode(blob) == value
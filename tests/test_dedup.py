@@ -0,0 +1,55 @@
+from base64 import b32encode
+
+from lib.utils.dedup import get_dedup_key, magnet_info_hash, remove_duplicate
+
+INFO_HASH = "0123456789abcdef0123456789abcdef01234567"
+BASE32_HASH = b32encode(bytes.fromhex(INFO_HASH)).decode()
+
+
+def jackett_row(btih):
+    return {
+        "title": "Show.S01E01.1080p.WEB-DL-GRP",
+        "infoHash": None,
+        "guid": "magnet:?xt=urn:btih:{}&dn=Show.S01E01".format(btih),
+        "indexer": "Jackett",
+        "provider": "1337x",
+        "seeders": 12,
+        "languages": ["en"],
+    }
+
+
+def torrentio_row():
+    return {
+        "title": "Show S01E01 1080p WEB-DL GRP",
+        "infoHash": INFO_HASH,
+        "indexer": "Torrentio",
+        "provider": "RARBG",
+        "seeders": 40,
+        "languages": ["fr"],
+    }
+
+
+def test_magnet_info_hash_hex_and_base32():
+    assert magnet_info_hash("magnet:?xt=urn:btih:" + INFO_HASH.upper()) == INFO_HASH
+    assert magnet_info_hash("magnet:?xt=urn:btih:" + BASE32_HASH) == INFO_HASH
+    assert magnet_info_hash("magnet:?dn=nohash") is None
+    assert magnet_info_hash("https://example.com/file.torrent") is None
+    assert magnet_info_hash(None) is None
+
+
+def test_magnet_url_keys_by_hash():
+    row = {"infoHash": "", "guid": "https://tracker/details/1"}
+    row["magnetUrl"] = "magnet:?xt=urn:btih:" + BASE32_HASH
+    assert get_dedup_key(row) == "hash:" + INFO_HASH
+
+
+def test_jackett_and_torrentio_duplicates_merge():
+    for btih in (INFO_HASH.upper(), BASE32_HASH):
+        results = remove_duplicate([jackett_row(btih), torrentio_row()])
+
+        assert len(results) == 1
+        merged = results[0]
+        assert merged["indexers"] == ["Jackett", "Torrentio"]
+        assert merged["providers"] == ["1337x", "RARBG"]
+        assert merged["languages"] == ["en", "fr"]
+        assert merged["seeders"] == 40